@@ -1,29 +1,63 @@
+import logging
+import os
+import shutil
+import socket
 import subprocess
+import tempfile
+import threading
 from pathlib import Path
+from typing import Callable, List
 
 import pytest
 
-# Constants for testing
-CONFIG_FILE = "test_config.ini"
-DATA_FILE = "test_data.txt"
+from core.config import ServerConfig
+from core.server import DEFAULT_SEARCH, FileSearchServer
+
+
+@pytest.fixture(scope="session")
+def data_dir(tmp_path_factory) -> Path:
+    """Directory for test data files, in memory (/dev/shm) when possible.
+
+    Falls back to pytest's temporary directory on systems without
+    /dev/shm. Removed at the end of the session.
+    """
+    if not os.path.isdir("/dev/shm"):
+        yield tmp_path_factory.mktemp("data")
+        return
+    path = Path(tempfile.mkdtemp(prefix="gmts_", dir="/dev/shm"))
+    yield path
+    shutil.rmtree(path, ignore_errors=True)
 
 
 # Ensure all fixtures have the same scope
 @pytest.fixture(scope="module")
-def config_file(tmp_path_factory):
-    return tmp_path_factory.mktemp("data") / "test_config.ini"
+def config_file(data_dir):
+    return Path(tempfile.mkdtemp(dir=data_dir)) / "test_config.ini"
 
 
 # the scope is as such so that if the file is changed in one test,
 # it doesn't affect the other tests
 @pytest.fixture(scope="function")
-def data_file(tmp_path_factory) -> Path:
-    return tmp_path_factory.mktemp("data") / "test_data.txt"
+def data_file(data_dir) -> Path:
+    return Path(tempfile.mkdtemp(dir=data_dir)) / "test_data.txt"
 
 
-@pytest.fixture(scope="module")
+@pytest.fixture(scope="session")
+def big_data_file(data_dir) -> Path:
+    """250000 lines of "test string <i>", written once per session."""
+    path = data_dir / "big_data.txt"
+    # bytes %-formatting through map() keeps the loop in C
+    path.write_bytes(b"".join(map(b"test string %d\n".__mod__, range(250000))))
+    return path
+
+
+@pytest.fixture(scope="session")
 def ssl_files(tmp_path_factory):
-    """Generates SSL certificate and key files for testing."""
+    """Generates SSL certificate and key files for testing.
+
+    Shared by the whole session, so tests must not modify the files. The
+    key is a P-256 EC key, which is much faster to generate than RSA.
+    """
     ssl_dir = tmp_path_factory.mktemp("ssl")
     cert_file = str(ssl_dir / "server.crt")
     key_file = str(ssl_dir / "server.key")
@@ -33,7 +67,9 @@ def ssl_files(tmp_path_factory):
             "req",
             "-x509",
             "-newkey",
-            "rsa:2048",
+            "ec",
+            "-pkeyopt",
+            "ec_paramgen_curve:prime256v1",
             "-keyout",
             key_file,
             "-out",
@@ -43,6 +79,75 @@ def ssl_files(tmp_path_factory):
             "-subj",
             "/CN=localhost",
             "-nodes",
-        ]
+        ],
+        check=True,
+        capture_output=True,
     )
     return cert_file, key_file
+
+
+def _start_threaded_server(config: ServerConfig) -> FileSearchServer:
+    """Starts FileSearchServer on a daemon thread with an ephemeral port."""
+    logger = logging.getLogger("threaded_server")
+    server = FileSearchServer(
+        config,
+        logger,
+        DEFAULT_SEARCH(config, logger),
+        server_socket=socket.create_server(("127.0.0.1", 0)),
+    )
+    threading.Thread(target=server.start, daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def threaded_server() -> Callable[[ServerConfig], int]:
+    """Runs FileSearchServer on a background thread of the test process.
+
+    Returns a function that starts a server for the given config on a
+    pre-bound ephemeral port and returns that port. Avoids starting a
+    Python subprocess for tests that don't need the server's CLI.
+    """
+    servers: List[FileSearchServer] = []
+
+    def start(config: ServerConfig) -> int:
+        servers.append(_start_threaded_server(config))
+        return servers[-1].port
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture(scope="session")
+def server(tmp_path_factory) -> int:
+    """Port of a plain server shared by the whole session.
+
+    Serves "test string 1" and "test string 2" from its own temporary
+    directory; tests must not modify its data.
+    """
+    data_file = tmp_path_factory.mktemp("srv") / "data.txt"
+    data_file.write_text("test string 1\ntest string 2\n")
+    server = _start_threaded_server(ServerConfig(linux_path=str(data_file)))
+    yield server.port
+    server.stop()
+
+
+@pytest.fixture(scope="session")
+def ssl_server(tmp_path_factory, ssl_files) -> int:
+    """Port of a TLS server using ssl_files, shared by the whole session.
+
+    Serves "test string 1"; tests must not modify its data.
+    """
+    cert_file, key_file = ssl_files
+    data_file = tmp_path_factory.mktemp("ssl_srv") / "data.txt"
+    data_file.write_text("test string 1\n")
+    server = _start_threaded_server(
+        ServerConfig(
+            linux_path=str(data_file),
+            ssl_enabled=True,
+            certfile=cert_file,
+            keyfile=key_file,
+        )
+    )
+    yield server.port
+    server.stop()
@@ -2,6 +2,7 @@ __all__ = [
     "aho_corasick_search",
     "binary_search",
     "boyer_moore_search",
+    "bytes_search",
     "linear_search",
     "regex_search",
     "multiprocessing_search",
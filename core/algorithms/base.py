@@ -1,11 +1,14 @@
 import logging
+import os
 import sys
+import threading
 from abc import ABC, abstractmethod
 from functools import wraps
 from pathlib import Path
-from typing import Any, Iterator, List
+from typing import Any, Iterator, List, Optional, Tuple
 
 from core.config import ServerConfig
+from core.utils import mtime_is_racy
 
 
 def handle_file_operations(method):
@@ -44,6 +47,8 @@ class SearchAlgorithm(ABC):
         self.config = config
         self.logger = logger
         self._data: Any = None
+        self._file_state: Optional[Tuple[int, int, int]] = None
+        self._publish_lock = threading.Lock()
         self.reload_data()
 
     @abstractmethod
@@ -57,8 +62,32 @@ class SearchAlgorithm(ABC):
         pass
 
     def reload_data(self):
-        """Reloads the data."""
-        self._data = self._read_data(self.config.linux_path)
+        """Reloads the data, unless the file is unchanged since the last load.
+
+        The file counts as unchanged while its inode, size and mtime match
+        the last load, and its mtime is older than RACY_MTIME_WINDOW_NS at
+        load time.
+
+        The new data is built completely before it is published with a
+        single reference swap, so concurrent searches never take a lock and
+        always see either the old or the new data, never a partial one.
+        Searches should read ``self._data`` once into a local.
+        """
+        try:
+            st = os.stat(self.config.linux_path)
+            file_state = (st.st_ino, st.st_size, st.st_mtime_ns)
+        except (OSError, TypeError):
+            file_state = None
+        if file_state is not None and file_state == self._file_state:
+            return
+        data = self._read_data(self.config.linux_path)
+        if file_state is not None and mtime_is_racy(file_state[2]):
+            file_state = None
+        # Data and state are published together, so a racing reload can't
+        # leave new state recorded next to old data.
+        with self._publish_lock:
+            self._data = data
+            self._file_state = file_state
 
     @handle_file_operations
     def _read_lines(self, file_path: Path) -> List[str]:
@@ -0,0 +1,27 @@
+import logging
+from bisect import bisect_left
+from pathlib import Path
+from typing import List
+
+from core.algorithms.base import SearchAlgorithm, reread_on_query_if_required
+from core.config import ServerConfig
+
+
+class BinarySearch(SearchAlgorithm):
+    """Searches a sorted copy of the file using binary search."""
+
+    name: str = "Binary Search"
+
+    def __init__(self, config: ServerConfig, logger: logging.Logger):
+        super().__init__(config, logger)
+
+    def _read_data(self, file_path: Path) -> List[str]:
+        """Reads lines from the file and sorts them once."""
+        return sorted(self._read_lines(file_path))
+
+    @reread_on_query_if_required
+    def search(self, query: str) -> bool:
+        """Performs a binary search of the sorted data."""
+        data = self._data
+        index = bisect_left(data, query)
+        return index < len(data) and data[index] == query
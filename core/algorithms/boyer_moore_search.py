@@ -1,6 +1,6 @@
 import logging
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
 from core.algorithms.base import SearchAlgorithm, reread_on_query_if_required
 from core.config import ServerConfig
@@ -21,18 +21,23 @@ class BoyerMooreSearch(SearchAlgorithm):
     @reread_on_query_if_required
     def search(self, query: str) -> bool:
         """Searches for the query using the Boyer-Moore algorithm."""
+        # The table depends only on the query, so build it once per search.
+        bad_char = self._bad_character_table(query, len(query))
         for line in self._data:
-            if self.boyer_moore(line, query):
+            if self.boyer_moore(line, query, bad_char):
                 return True
         return False
 
-    def boyer_moore(self, text: str, pattern: str) -> bool:
+    def boyer_moore(
+        self, text: str, pattern: str, bad_char: Optional[dict] = None
+    ) -> bool:
         n = len(text)
         m = len(pattern)
         if m > n:
             return False
 
-        bad_char = self._bad_character_table(pattern, m)
+        if bad_char is None:
+            bad_char = self._bad_character_table(pattern, m)
 
         s = 0
         while s <= n - m:
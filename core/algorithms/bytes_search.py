@@ -0,0 +1,47 @@
+import logging
+from pathlib import Path
+
+from core.algorithms.base import (
+    SearchAlgorithm,
+    handle_file_operations,
+    reread_on_query_if_required,
+)
+from core.config import ServerConfig
+
+
+class BytesSearch(SearchAlgorithm):
+    """Searches the raw file contents with a single substring scan.
+
+    Matches whole lines byte for byte (a trailing "\\r" is ignored), so
+    unlike the line-based algorithms it does not strip surrounding
+    whitespace from the lines in the file.
+    """
+
+    name: str = "Bytes Search"
+
+    def __init__(self, config: ServerConfig, logger: logging.Logger):
+        super().__init__(config, logger)
+
+    @handle_file_operations
+    def _read_data(self, file_path: Path) -> bytes:
+        """Reads the file as one newline-delimited bytes object.
+
+        The contents are wrapped in newlines so every line, including the
+        first and last, can be matched as "\\n" + line + "\\n". A final
+        newline is only added if the file lacks one, so it doesn't read as
+        an extra empty line.
+        """
+        with open(file_path, "rb") as f:
+            contents = f.read().replace(b"\r\n", b"\n")
+        if contents and not contents.endswith(b"\n"):
+            contents += b"\n"
+        return b"\n" + contents
+
+    @reread_on_query_if_required
+    def search(self, query: str) -> bool:
+        """Looks for the query as a complete line of the file."""
+        needle = query.encode("utf-8")
+        # A query spanning a newline would match two adjacent lines
+        if b"\n" in needle:
+            return False
+        return b"\n" + needle + b"\n" in self._data
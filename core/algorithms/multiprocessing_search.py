@@ -1,10 +1,23 @@
 import logging
 import multiprocessing
 from pathlib import Path
-from typing import List, Tuple
+from typing import List
 
 from core.algorithms.base import SearchAlgorithm, reread_on_query_if_required
 from core.config import ServerConfig
+from core.utils import available_cpu_count
+
+# Lines handed to each pool worker once, when the worker starts.
+_worker_lines: List[str] = []
+
+
+def _init_worker(lines: List[str]) -> None:
+    global _worker_lines
+    _worker_lines = lines
+
+
+def _search_range(start: int, stop: int, query: str) -> bool:
+    return query in _worker_lines[start:stop]
 
 
 class MultiprocessingSearch(SearchAlgorithm):
@@ -21,13 +34,19 @@ class MultiprocessingSearch(SearchAlgorithm):
 
     @reread_on_query_if_required
     def search(self, query: str) -> bool:
-        """Searches for the query using multiprocessing."""
-        with multiprocessing.Pool() as pool:
-            results = pool.map(
-                self._search_line, [(line, query) for line in self._data]
-            )
-        return any(results)
-
-    def _search_line(self, data: Tuple[str, str]) -> bool:
-        line, query = data
-        return line == query
+        """Searches for the query using multiprocessing.
+
+        The lines are passed to each worker once through the pool
+        initializer (inherited without pickling under fork); tasks only
+        carry index ranges and the query.
+        """
+        data = self._data
+        processes = available_cpu_count()
+        step = max(1, -(-len(data) // processes))
+        ranges = [
+            (start, start + step, query) for start in range(0, len(data), step)
+        ]
+        with multiprocessing.Pool(
+            processes, initializer=_init_worker, initargs=(data,)
+        ) as pool:
+            return any(pool.starmap(_search_range, ranges))
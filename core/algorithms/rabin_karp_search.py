@@ -1,6 +1,6 @@
 import logging
 from pathlib import Path
-from typing import List
+from typing import List, Optional, Tuple
 
 from core.algorithms.base import SearchAlgorithm, reread_on_query_if_required
 from core.config import ServerConfig
@@ -21,27 +21,32 @@ class RabinKarpSearch(SearchAlgorithm):
     @reread_on_query_if_required
     def search(self, query: str) -> bool:
         """Searches for the query using the Rabin-Karp algorithm."""
+        # The pattern hash depends only on the query, so compute it once.
+        precomputed = self._pattern_hash(query)
         for line in self._data:
-            if self.rabin_karp(line, query):
+            if self.rabin_karp(line, query, precomputed=precomputed):
                 return True
         return False
 
-    def rabin_karp(self, text: str, pattern: str, prime=101) -> bool:
+    def rabin_karp(
+        self,
+        text: str,
+        pattern: str,
+        prime=101,
+        precomputed: Optional[Tuple[int, int]] = None,
+    ) -> bool:
         """Performs Rabin-Karp algorithm"""
         n = len(text)
         m = len(pattern)
         if m > n:
             return False
 
-        pattern_hash = 0
+        if precomputed is None:
+            precomputed = self._pattern_hash(pattern, prime)
+        pattern_hash, h = precomputed
         text_hash = 0
-        h = 1
-
-        for i in range(m - 1):
-            h = h * prime
 
         for i in range(m):
-            pattern_hash = prime * pattern_hash + ord(pattern[i])
             text_hash = prime * text_hash + ord(text[i])
 
         for i in range(n - m + 1):
@@ -53,3 +58,10 @@ class RabinKarpSearch(SearchAlgorithm):
                     text[i + m]
                 )
         return False
+
+    def _pattern_hash(self, pattern: str, prime=101) -> Tuple[int, int]:
+        """Returns the pattern's hash and the factor for the leading char."""
+        pattern_hash = 0
+        for char in pattern:
+            pattern_hash = prime * pattern_hash + ord(char)
+        return pattern_hash, prime ** max(len(pattern) - 1, 0)
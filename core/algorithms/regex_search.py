@@ -1,5 +1,6 @@
 import logging
 import re
+from functools import lru_cache
 from pathlib import Path
 from typing import List
 
@@ -7,6 +8,12 @@ from core.algorithms.base import SearchAlgorithm, reread_on_query_if_required
 from core.config import ServerConfig
 
 
+@lru_cache(maxsize=256)
+def _compile(pattern: str) -> re.Pattern:
+    """Compiles a pattern once and reuses it for repeated queries."""
+    return re.compile(pattern)
+
+
 class RegexSearch(SearchAlgorithm):
     """Searches a file using regular expressions."""
 
@@ -22,7 +29,8 @@ class RegexSearch(SearchAlgorithm):
     @reread_on_query_if_required
     def search(self, query: str) -> bool:
         """Searches for the query using regular expressions."""
+        fullmatch = _compile(query).fullmatch
         for line in self._data:
-            if re.fullmatch(query, line):
+            if fullmatch(line):
                 return True
         return False
@@ -1,6 +1,6 @@
 import logging
 from pathlib import Path
-from typing import Any, List, Optional, Set
+from typing import FrozenSet
 
 from core.algorithms.base import SearchAlgorithm, reread_on_query_if_required
 from core.config import ServerConfig
@@ -14,9 +14,9 @@ class SetSearch(SearchAlgorithm):
     def __init__(self, config: ServerConfig, logger: logging.Logger):
         super().__init__(config, logger)
 
-    def _read_data(self, file_path: Path) -> Set[str]:
-        """Reads lines from the file and creates a set."""
-        return set(self._read_lines(file_path))
+    def _read_data(self, file_path: Path) -> FrozenSet[str]:
+        """Reads lines from the file and creates a frozenset."""
+        return frozenset(self._read_lines(file_path))
 
     @reread_on_query_if_required
     def search(self, query: str) -> bool:
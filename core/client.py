@@ -1,14 +1,103 @@
 #!/usr/bin/env python
 
 import argparse
+import asyncio
+import ipaddress
+import os
 import socket
 import ssl
+from dataclasses import replace
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 from core.config import ClientConfig, load_client_config
 from core.logger import setup_logger
+from core.utils import mtime_is_racy
 
 
 TIMEOUT = 3  # for unusual cases, 3 seconds
+# Queries sent ahead of reading their responses. Bounded so the unread
+# responses always fit in the socket buffers and neither side blocks.
+PIPELINE_DEPTH = 1000
+
+
+def _getaddrinfo(host: str, port: int) -> Tuple:
+    addresses = socket.getaddrinfo(
+        host, port, socket.AF_INET, socket.SOCK_STREAM
+    )
+    return addresses[0][4]
+
+
+_resolve_cached = lru_cache(maxsize=16)(_getaddrinfo)
+
+
+def _resolve(host: str, port: int) -> Tuple:
+    """Resolves an IPv4 server address.
+
+    Literal IPs and localhost can't change, so they are resolved once and
+    cached for the process lifetime. Other names are looked up on every
+    call, so DNS changes are picked up.
+    """
+    if host == "localhost":
+        return _resolve_cached(host, port)
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        return _getaddrinfo(host, port)
+    return _resolve_cached(host, port)
+
+
+@lru_cache(maxsize=8)
+def _load_ssl_context(
+    cert_file: Optional[str], mtime_ns: Optional[int]
+) -> ssl.SSLContext:
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    # Load the server's self-signed certificate so the client trusts it
+    context.load_verify_locations(cafile=cert_file)
+    return context
+
+
+def _ssl_context(cert_file: Optional[str]) -> ssl.SSLContext:
+    """Returns a client SSL context that trusts cert_file.
+
+    Contexts are reused until the certificate file changes, so repeated
+    queries don't parse the certificate again. Failures are not cached,
+    and neither are certificates modified within RACY_MTIME_WINDOW_NS.
+    """
+    mtime_ns = None
+    if cert_file is not None:
+        try:
+            mtime_ns = os.stat(cert_file).st_mtime_ns
+        except OSError:
+            pass
+        else:
+            if mtime_is_racy(mtime_ns):
+                return _load_ssl_context.__wrapped__(cert_file, mtime_ns)
+    return _load_ssl_context(cert_file, mtime_ns)
+
+
+# The last TLS session per server, with the context it belongs to, so the
+# next connection can resume it instead of doing a full handshake.
+_tls_sessions: Dict[Tuple[str, int], Tuple[ssl.SSLContext, ssl.SSLSession]] = {}
+
+
+def _tls_session(
+    context: ssl.SSLContext, server: str, port: int
+) -> Optional[ssl.SSLSession]:
+    cached = _tls_sessions.get((server, port))
+    if cached is not None and cached[0] is context:
+        return cached[1]
+    return None
+
+
+def _remember_tls_session(sock: ssl.SSLSocket, server: str, port: int) -> None:
+    """Keeps sock's TLS session for resumption by the next connection.
+
+    TLS 1.3 sends session tickets after the handshake, so call this after
+    a response has been read.
+    """
+    if sock.session is not None:
+        _tls_sessions[(server, port)] = (sock.context, sock.session)
 
 
 def client_query(config: ClientConfig) -> str:
@@ -18,22 +107,158 @@ def client_query(config: ClientConfig) -> str:
     try:
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
             if config.ssl_enabled:
-                context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
-                # Load the server's self-signed certificate so the client trusts it
-                context.load_verify_locations(cafile=config.cert_file)
+                context = _ssl_context(config.cert_file)
                 sock = context.wrap_socket(
-                    sock, server_hostname=config.server
+                    sock,
+                    server_hostname=config.server,
+                    session=_tls_session(context, config.server, config.port),
                 )  # server_hostname is important for hostname verification
 
             sock.settimeout(TIMEOUT)
-            sock.connect((config.server, config.port))
+            sock.connect(_resolve(config.server, config.port))
             sock.sendall(config.query.encode("utf-8"))
             response = sock.recv(1024).decode("utf-8").strip()
+            if isinstance(sock, ssl.SSLSocket):
+                _remember_tls_session(sock, config.server, config.port)
             return response
     except Exception as e:
         return f"Error: {e}"
 
 
+class ClientSession:
+    """A connection to the server that is reused for several queries.
+
+    Queries are sent newline-terminated, which makes the server keep the
+    connection open between them. Connects on the first query; errors
+    are raised rather than returned as "Error: ..." strings.
+
+    The server tells the two kinds of connection apart by its first read,
+    so the first query must be shorter than the server's PAYLOAD_SIZE
+    (1024 bytes) including its newline; a longer one is answered as a
+    single query and the connection is closed.
+    """
+
+    def __init__(self, config: ClientConfig):
+        self.config = config
+        self.sock: Optional[socket.socket] = None
+        self._buffer = b""
+
+    def __enter__(self) -> "ClientSession":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _connect(self) -> socket.socket:
+        sock = socket.create_connection(
+            _resolve(self.config.server, self.config.port), timeout=TIMEOUT
+        )
+        if self.config.ssl_enabled:
+            context = _ssl_context(self.config.cert_file)
+            sock = context.wrap_socket(
+                sock,
+                server_hostname=self.config.server,
+                session=_tls_session(
+                    context, self.config.server, self.config.port
+                ),
+            )
+        return sock
+
+    def query(self, query: str) -> str:
+        """Sends one query and returns the server's response."""
+        if self.sock is None:
+            self.sock = self._connect()
+        self.sock.sendall(query.encode("utf-8") + b"\n")
+        return self._read_response(self.sock)
+
+    def query_many(self, queries: Iterable[str]) -> Iterator[str]:
+        """Pipelines queries and yields their responses in order.
+
+        Up to PIPELINE_DEPTH queries are sent in one write before their
+        responses are read, so the round trips overlap.
+        """
+        if self.sock is None:
+            self.sock = self._connect()
+        queries = list(queries)
+        for start in range(0, len(queries), PIPELINE_DEPTH):
+            batch = queries[start : start + PIPELINE_DEPTH]
+            self.sock.sendall(
+                b"".join(query.encode("utf-8") + b"\n" for query in batch)
+            )
+            for _ in batch:
+                yield self._read_response(self.sock)
+
+    def _read_response(self, sock: socket.socket) -> str:
+        while b"\n" not in self._buffer:
+            chunk = sock.recv(4096)
+            if not chunk:
+                raise ConnectionError("Server closed the connection")
+            self._buffer += chunk
+        response, self._buffer = self._buffer.split(b"\n", 1)
+        return response.decode("utf-8").strip()
+
+    def close(self) -> None:
+        if self.sock is not None:
+            if isinstance(self.sock, ssl.SSLSocket):
+                _remember_tls_session(
+                    self.sock, self.config.server, self.config.port
+                )
+            self.sock.close()
+            self.sock = None
+
+
+async def async_client_query(config: ClientConfig) -> str:
+    """
+    Sends a query to the server from a coroutine and returns the response.
+
+    Lets many concurrent queries share one thread and event loop. Errors
+    are returned as "Error: ..." strings, like client_query.
+    """
+
+    async def query() -> str:
+        context = None
+        if config.ssl_enabled:
+            context = _ssl_context(config.cert_file)
+        reader, writer = await asyncio.open_connection(
+            *_resolve(config.server, config.port),
+            ssl=context,
+            server_hostname=config.server if context else None,
+        )
+        try:
+            # Sent without a newline, as client_query does, so the server
+            # answers and closes the connection itself.
+            writer.write(config.query.encode("utf-8"))
+            await writer.drain()
+            response = await reader.read()
+        finally:
+            writer.close()
+        return response.decode("utf-8").strip()
+
+    try:
+        return await asyncio.wait_for(query(), TIMEOUT)
+    except Exception as e:
+        return f"Error: {e}"
+
+
+def client_query_many(
+    config: ClientConfig, queries: Iterable[str]
+) -> List[str]:
+    """
+    Pipelines several queries over one connection and returns the responses.
+
+    Like client_query, a failure is reported as an "Error: ..." response,
+    which is repeated for every query that did not get an answer.
+    """
+    queries = list(queries)
+    responses: List[str] = []
+    try:
+        with ClientSession(config) as session:
+            responses.extend(session.query_many(queries))
+    except Exception as e:
+        responses.extend([f"Error: {e}"] * (len(queries) - len(responses)))
+    return responses
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Client script to query the TCP Server"
@@ -70,16 +295,18 @@ def main():
         logger.info(f"Client configuration Loaded: {client_config}")
 
     # Override client config with command line arguments.
+    overrides = {}
     if args.query:
-        client_config.query = args.query  # Overwrite the query
+        overrides["query"] = args.query  # Overwrite the query
     if args.server:
-        client_config.server = args.server
+        overrides["server"] = args.server
     if args.port:
-        client_config.port = args.port
+        overrides["port"] = args.port
     if args.ssl_enabled is not None:
-        client_config.ssl_enabled = args.ssl_enabled
+        overrides["ssl_enabled"] = args.ssl_enabled
     if args.cert_file:
-        client_config.cert_file = args.cert_file
+        overrides["cert_file"] = args.cert_file
+    client_config = replace(client_config, **overrides)
 
     if (
         any(
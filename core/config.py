@@ -1,14 +1,19 @@
 import configparser
 import logging
+import os
 import re
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+from functools import wraps
 from typing import Optional
 
 from core.logger import Verbosity
-from core.utils import check_file_exists
+from core.utils import check_file_exists, mtime_is_racy
 
+CONFIG_CACHE_SIZE = 32
+LINUXPATH_RE = re.compile(r"^linuxpath=(.*)", re.MULTILINE)
 
-@dataclass
+
+@dataclass(slots=True)
 class ServerConfig:
     """Configuration for the FileSearchServer."""
 
@@ -19,11 +24,15 @@ class ServerConfig:
     certfile: str = "server.crt"
     keyfile: str = "server.key"
     verbosity: Verbosity = logging.INFO
+    workers: int = 1
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ClientConfig:
-    """Configuration for the client application."""
+    """Configuration for the client application.
+
+    Immutable; use dataclasses.replace to derive a changed copy.
+    """
 
     server: str
     port: int
@@ -32,6 +41,42 @@ class ClientConfig:
     cert_file: Optional[str] = None
 
 
+def _cache_by_file_state(loader):
+    """Caches a loader's successful results by path, mtime and size.
+
+    Rewriting a config file changes its key, so a changed file is parsed
+    again. Files modified within RACY_MTIME_WINDOW_NS are not cached, since
+    a same-size rewrite may not move their mtime. Failures (missing files,
+    parse errors) are not cached and log on every call. Frozen configs are
+    shared between callers; mutable ones are copied so callers may modify
+    theirs.
+    """
+    cache = {}
+
+    @wraps(loader)
+    def wrapper(config_path: str, logger: logging.Logger):
+        try:
+            stat = os.stat(config_path)
+        except OSError:
+            return loader(config_path, logger)
+        key = (os.fspath(config_path), stat.st_mtime_ns, stat.st_size)
+        config = cache.get(key)
+        if config is None:
+            config = loader(config_path, logger)
+            if config is None or mtime_is_racy(stat.st_mtime_ns):
+                return config
+            if len(cache) >= CONFIG_CACHE_SIZE:
+                cache.pop(next(iter(cache)))
+            cache[key] = config
+        if config.__dataclass_params__.frozen:
+            return config
+        return replace(config)
+
+    wrapper.cache_clear = cache.clear
+    return wrapper
+
+
+@_cache_by_file_state
 def load_server_config(
     config_path: str, logger: logging.Logger
 ) -> ServerConfig:
@@ -45,11 +90,10 @@ def load_server_config(
         exit(1)
 
     with open(config_path, "r") as f:
-        for line in f:
-            match = re.match(r"linuxpath=(.*)", line)
-            if match:
-                linux_path = match.group(1).strip()
-                break  # Only grab the first one
+        # A single scan of the whole file; only the first match is used.
+        match = LINUXPATH_RE.search(f.read())
+    if match:
+        linux_path = match.group(1).strip()
 
     if not linux_path:
         logger.critical("Config file must have a linuxpath line.")
@@ -58,6 +102,7 @@ def load_server_config(
     return server_config
 
 
+@_cache_by_file_state
 def load_extra_server_config(
     config_path: str, logger: logging.Logger
 ) -> Optional[ServerConfig]:
@@ -84,6 +129,7 @@ def load_extra_server_config(
             linux_path=config.get("Server", "linuxpath"),
             certfile=config.get("Server", "certfile", fallback="server.crt"),
             keyfile=config.get("Server", "keyfile", fallback="server.key"),
+            workers=config.getint("Server", "workers", fallback=1),
         )
     except Exception as e:
         logger.error(f"Error parsing server config: {e}")
@@ -92,6 +138,7 @@ def load_extra_server_config(
     return server_config
 
 
+@_cache_by_file_state
 def load_client_config(
     config_path: str, logger: logging.Logger
 ) -> Optional[ClientConfig]:
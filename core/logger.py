@@ -65,9 +65,17 @@ class CustomFormatter(logging.Formatter):
 def setup_logger(
     name: str = "AppLogger", level: Verbosity = "INFO"
 ) -> logging.Logger:
-    """Set up and return a configured logger."""
+    """Set up and return a configured logger.
+
+    Calling it again for the same name only updates the level; adding
+    handlers again would emit every record once per call.
+    """
     logger = logging.getLogger(name)
     logger.setLevel(level)
+    if logger.handlers:
+        for handler in logger.handlers:
+            handler.setLevel(level)
+        return logger
 
     formatter = CustomFormatter()
 
@@ -3,12 +3,17 @@
 import argparse
 import importlib
 import logging
+import os
+import queue
+import selectors
+import signal
 import socket
 import ssl
+import threading
 import time
 from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Tuple, Type
+from typing import Dict, List, Optional, Tuple, Type
 
 from core.algorithms.base import SearchAlgorithm
 from core.algorithms.linear_search import LinearSearch
@@ -24,6 +29,21 @@ from core.utils import find_available_port
 DEFAULT_SEARCH: Type[SearchAlgorithm] = SetSearch
 CLIENT_SOCKET_TIMEOUT = 5.01e-3  # 50ms
 MAX_WORKERS = 100
+LISTEN_BACKLOG = socket.SOMAXCONN
+SOCKET_BUFFER_SIZE = 1 << 20
+PAYLOAD_SIZE = 1024
+# Connections that send newline-terminated queries are kept open.
+KEEPALIVE_TIMEOUT = 3
+KEEPALIVE_BUFFER_SIZE = 65536
+
+# Responses are encoded once instead of on every request.
+STRING_EXISTS = b"STRING EXISTS\n"
+STRING_NOT_FOUND = b"STRING NOT FOUND\n"
+UNEXPECTED_ERROR = b"Error: Unexpected error occured\n"
+
+# An idle keep-alive connection: its socket, the client's address and the
+# start of a query it has not finished sending yet.
+ParkedConnection = Tuple[socket.socket, Tuple[str, int], bytes]
 
 
 def load_search_algorithm(
@@ -57,7 +77,13 @@ class FileSearchServer:
         config: ServerConfig,
         logger: logging.Logger,
         search_algorithm: SearchAlgorithm,
+        server_socket: Optional[socket.socket] = None,
     ):
+        """Set up the server.
+
+        If `server_socket` is given it must already be bound and listening;
+        the server then accepts on it instead of binding `config.port`.
+        """
         self.logger = logger
         self.config = config
         # TODO: add a max workers config option
@@ -67,8 +93,19 @@ class FileSearchServer:
         self.reread_on_query = self.config.reread_on_query
         self.linux_path = Path(self.config.linux_path)
         self.ssl_context = self._setup_ssl() if self.ssl_enabled else None
-        self.server_socket = self._setup_server()
+        if server_socket is None:
+            server_socket = self._setup_server()
+        else:
+            self.port = server_socket.getsockname()[1]
+        self.server_socket = server_socket
         self.search_algorithm = search_algorithm
+        self._stopping = False
+        # Idle keep-alive connections, handed to the idle watcher thread
+        self._parked: "queue.SimpleQueue[ParkedConnection]" = (
+            queue.SimpleQueue()
+        )
+        self._idle_lock = threading.Lock()
+        self._idle_wakeup: Optional[socket.socket] = None
 
     def _setup_ssl(self) -> ssl.SSLContext:
         """Set up SSL context if enabled."""
@@ -86,84 +123,357 @@ class FileSearchServer:
         """Bind and set up the server socket."""
         try:
             server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            # Allows restarting on the port while connections from the
+            # previous server are still in TIME_WAIT.
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if self.config.workers > 1 and hasattr(socket, "SO_REUSEPORT"):
+                # Lets the workers' listeners share the port; the kernel then
+                # balances incoming connections across their accept queues.
+                # Only set with workers, so that a second server started on
+                # the same port fails instead of silently taking a share.
+                server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            # Accepted connections inherit these, so pipelined batches of
+            # queries and answers need fewer reads and writes.
+            server.setsockopt(
+                socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE
+            )
+            server.setsockopt(
+                socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_SIZE
+            )
             server.bind(("", self.port))
-            server.listen(5)
+            server.listen(LISTEN_BACKLOG)
             self.logger.info(f"Server listening on port {self.port}")
             return server
         except Exception as e:
             self.logger.error(f"Error setting up server socket: {e}")
             exit(1)
 
+    def _answer(self, payload: bytes, client_address: Tuple[str, int]) -> bytes:
+        """Search for a single query and return the encoded response."""
+        start_time = time.perf_counter()
+        data: str = payload[:PAYLOAD_SIZE].decode("utf-8").strip("\x00\r")
+        if not data:
+            return STRING_NOT_FOUND
+
+        # Rereading (if enabled) is handled by the algorithm itself.
+        response = (
+            STRING_EXISTS
+            if self.search_algorithm.search(data)
+            else STRING_NOT_FOUND
+        )
+
+        # Skip building the message entirely unless DEBUG is enabled.
+        if self.logger.isEnabledFor(logging.DEBUG):
+            end_time = time.perf_counter()
+            self.logger.debug(
+                f"DEBUG: Query='{data}', IP={client_address[0]}, Time={end_time - start_time:.5f}s"
+            )
+        return response
+
+    def _serve_lines(
+        self,
+        client_socket: socket.socket,
+        client_address: Tuple[str, int],
+        buffer: bytes,
+    ) -> bool:
+        """Answer the newline-delimited queries the client has sent so far.
+
+        Once no more data is waiting, the connection is parked with the
+        idle watcher instead of blocking this pool thread until the next
+        query, and True is returned; the caller must not close it then.
+
+        A send that times out ends the connection without writing anything
+        more, so no stray reply can land among the answers to pipelined
+        queries.
+        """
+        client_socket.settimeout(KEEPALIVE_TIMEOUT)
+        try:
+            while True:
+                *lines, buffer = buffer.split(b"\n")
+                if lines:
+                    client_socket.sendall(
+                        b"".join(
+                            self._answer(line, client_address) for line in lines
+                        )
+                    )
+                if len(buffer) > KEEPALIVE_BUFFER_SIZE:
+                    self.logger.error(
+                        f"Query line too long from client {client_address}"
+                    )
+                    return False
+                chunk = self._recv_nowait(client_socket)
+                if chunk is None:
+                    self._park(client_socket, client_address, buffer)
+                    return True
+                if not chunk:
+                    break
+                buffer += chunk
+
+            # The last query may not be newline-terminated.
+            if buffer:
+                client_socket.sendall(self._answer(buffer, client_address))
+        except socket.timeout:
+            self.logger.debug("Connection timed out: %s", client_address)
+        return False
+
+    @staticmethod
+    def _recv_nowait(client_socket: socket.socket) -> Optional[bytes]:
+        """Returns what the client has sent, or None if nothing is waiting.
+
+        For TLS this also covers data already decrypted into the
+        SSLSocket's own buffer, which the idle watcher can't see.
+        """
+        client_socket.setblocking(False)
+        try:
+            return client_socket.recv(KEEPALIVE_BUFFER_SIZE)
+        except (BlockingIOError, ssl.SSLWantReadError):
+            return None
+        finally:
+            client_socket.settimeout(KEEPALIVE_TIMEOUT)
+
+    def _park(
+        self,
+        client_socket: socket.socket,
+        client_address: Tuple[str, int],
+        buffer: bytes,
+    ) -> None:
+        """Hand an idle keep-alive connection to the idle watcher."""
+        with self._idle_lock:
+            if self._idle_wakeup is None:
+                # Started on first use, so forked workers each get their own
+                wakeup_reader, self._idle_wakeup = socket.socketpair()
+                threading.Thread(
+                    target=self._watch_idle, args=(wakeup_reader,), daemon=True
+                ).start()
+            self._parked.put((client_socket, client_address, buffer))
+            self._idle_wakeup.send(b"\0")
+
+    def _watch_idle(self, wakeup_reader: socket.socket) -> None:
+        """Wait for parked connections to become readable or expire.
+
+        A readable connection goes back to the thread pool to answer its
+        next queries; one idle for KEEPALIVE_TIMEOUT is closed. Idle
+        connections thus hold no pool thread, so they can't starve
+        one-shot clients.
+        """
+        selector = selectors.DefaultSelector()
+        selector.register(wakeup_reader, selectors.EVENT_READ)
+        # Parked connections by file descriptor, with their idle deadline
+        idle: Dict[int, Tuple[ParkedConnection, float]] = {}
+        timeout = None
+        while True:
+            for key, _ in selector.select(timeout):
+                if key.fileobj is wakeup_reader:
+                    if not wakeup_reader.recv(4096):
+                        # The server stopped
+                        for (client_socket, _, _), _ in idle.values():
+                            client_socket.close()
+                        selector.close()
+                        wakeup_reader.close()
+                        return
+                    deadline = time.monotonic() + KEEPALIVE_TIMEOUT
+                    while not self._parked.empty():
+                        parked = self._parked.get()
+                        selector.register(parked[0], selectors.EVENT_READ)
+                        idle[parked[0].fileno()] = (parked, deadline)
+                    continue
+                (client_socket, client_address, buffer), _ = idle.pop(key.fd)
+                selector.unregister(client_socket)
+                try:
+                    self.thread_pool.submit(
+                        self._resume_lines,
+                        client_socket,
+                        client_address,
+                        buffer,
+                    )
+                except RuntimeError:
+                    # The pool was shut down
+                    client_socket.close()
+
+            now = time.monotonic()
+            for fd, (parked, deadline) in list(idle.items()):
+                if deadline <= now:
+                    del idle[fd]
+                    selector.unregister(parked[0])
+                    parked[0].close()
+                    self.logger.debug("Idle connection closed: %s", parked[1])
+            timeout = (
+                min(deadline for _, deadline in idle.values()) - now
+                if idle
+                else None
+            )
+
+    def _resume_lines(
+        self,
+        client_socket: socket.socket,
+        client_address: Tuple[str, int],
+        buffer: bytes,
+    ) -> None:
+        """Serve a parked keep-alive connection that has new data."""
+        parked = False
+        try:
+            parked = self._serve_lines(client_socket, client_address, buffer)
+        except Exception as e:
+            self.logger.error(f"Error handling client {client_address}: {e}")
+        finally:
+            if not parked:
+                client_socket.close()
+
     def _handle_client(
         self, client_socket: socket.socket, client_address: Tuple[str, int]
     ):
-        """Handle client requests in a separate thread."""
-        with client_socket:
-            # r = b"STRING EXISTS\n"
-            # client_socket.sendall(r)
-            # return
-            start_time = time.time()
-            try:
-                client_socket.settimeout(CLIENT_SOCKET_TIMEOUT)
-                data: str = (
-                    client_socket.recv(1024).decode("utf-8").strip("\x00")
-                )
-                if not data:
-                    client_socket.sendall(b"STRING NOT FOUND\n")
-                    return
+        """Handle client requests in a separate thread.
 
-                if self.config.reread_on_query:
-                    self.search_algorithm.reload_data()
-
-                response = (
-                    b"STRING EXISTS\n"
-                    if self.search_algorithm.search(data)
-                    else b"STRING NOT FOUND\n"
-                )
-                client_socket.sendall(response)
+        A payload without a newline is treated as a single query and the
+        connection is closed after the response. Newline-terminated
+        queries keep the connection open so that a client can send many
+        queries over one (TLS) handshake.
 
-                end_time = time.time()
-                self.logger.debug(
-                    f"DEBUG: Query='{data}', IP={client_address[0]}, Time={end_time - start_time:.5f}s"
+        Which of the two a connection is, is decided by its first read of
+        up to PAYLOAD_SIZE bytes. A keep-alive client's first query must
+        therefore fit in PAYLOAD_SIZE bytes including its newline, and
+        arrive in one piece; otherwise the connection is answered as a
+        single query and closed.
+        """
+        if self.ssl_context:
+            # The handshake runs here rather than in the accept loop, so a
+            # slow or failed handshake only affects this client.
+            try:
+                client_socket.settimeout(KEEPALIVE_TIMEOUT)
+                client_socket = self.ssl_context.wrap_socket(
+                    client_socket, server_side=True
                 )
-
-            except socket.timeout:
+            except (ssl.SSLError, OSError) as e:
                 self.logger.error(
-                    f"Connection timeout for client {client_address}"
+                    f"TLS handshake failed for client {client_address}: {e}"
                 )
-                try:
-                    # String not found, because it's either empty
-                    # or the client took too long to respond.
-                    client_socket.sendall(b"STRING NOT FOUND\n")
-                except Exception:
-                    pass
+                client_socket.close()
+                return
 
-            except Exception as e:
-                self.logger.error(
-                    f"Error handling client {client_address}: {e}"
+        parked = False
+        try:
+            client_socket.settimeout(CLIENT_SOCKET_TIMEOUT)
+            payload = client_socket.recv(PAYLOAD_SIZE)
+            if b"\n" in payload:
+                parked = self._serve_lines(
+                    client_socket, client_address, payload
                 )
-                try:
-                    client_socket.sendall(b"Error: Unexpected error occured\n")
-                except:
-                    pass
+            else:
+                client_socket.sendall(self._answer(payload, client_address))
 
-    def start(self) -> None:
-        """Start the server and accept connections using a thread pool."""
+        except socket.timeout:
+            # Only reached on the single-query path; keep-alive
+            # connections handle their own timeouts.
+            self.logger.error(f"Connection timeout for client {client_address}")
+            try:
+                # String not found, because it's either empty
+                # or the client took too long to respond.
+                client_socket.sendall(STRING_NOT_FOUND)
+            except Exception:
+                pass
+
+        except Exception as e:
+            self.logger.error(f"Error handling client {client_address}: {e}")
+            try:
+                client_socket.sendall(UNEXPECTED_ERROR)
+            except:
+                pass
+
+        finally:
+            if not parked:
+                client_socket.close()
+
+    def _accept_loop(self) -> None:
+        """Accept connections and hand them to the thread pool."""
         try:
             while True:
                 client_socket, client_address = self.server_socket.accept()
                 self.logger.info(f"Connection from {client_address}")
-                if self.ssl_context:
-                    client_socket = self.ssl_context.wrap_socket(
-                        client_socket, server_side=True
-                    )
+                client_socket.setsockopt(
+                    socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1
+                )
                 self.thread_pool.submit(
                     self._handle_client, client_socket, client_address
                 )
         except Exception as e:
+            if self._stopping:
+                return
             self.logger.critical(f"Server failed to start: {e}")
             exit(1)
 
+    def stop(self) -> None:
+        """Stop accepting connections, e.g. when running in a thread."""
+        self._stopping = True
+        try:
+            # Wakes up an accept() blocked in another thread.
+            self.server_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.server_socket.close()
+        with self._idle_lock:
+            if self._idle_wakeup is not None:
+                # Tells the idle watcher to close the parked connections
+                self._idle_wakeup.close()
+        self.thread_pool.shutdown(wait=False)
+
+    def _start_workers(self) -> None:
+        """Fork worker processes, each with its own accept loop.
+
+        Each worker runs its own accept loop and thread pool, so searches
+        (e.g. rereading the file on every query) run in parallel instead
+        of contending for a single GIL. The data loaded before the fork is
+        shared copy-on-write. The parent only supervises the workers.
+
+        Where SO_REUSEPORT is available every worker gets its own listening
+        socket bound to the same port, so accepts are not serialised on a
+        single queue. All sockets are bound before forking, so the port is
+        never left without a listener.
+        """
+        listeners = [self.server_socket]
+        if hasattr(socket, "SO_REUSEPORT") and self.server_socket.getsockopt(
+            socket.SOL_SOCKET, socket.SO_REUSEPORT
+        ):
+            listeners += [
+                self._setup_server() for _ in range(self.config.workers - 1)
+            ]
+
+        pids: List[int] = []
+        for worker in range(self.config.workers):
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    self.server_socket = listeners[worker % len(listeners)]
+                    for listener in listeners:
+                        if listener is not self.server_socket:
+                            listener.close()
+                    self._accept_loop()
+                finally:
+                    os._exit(1)
+            pids.append(pid)
+        for listener in listeners:
+            listener.close()
+        self.logger.info(f"Started {len(pids)} worker processes: {pids}")
+
+        def stop_workers(signum, frame):
+            for pid in pids:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+            raise SystemExit(0)
+
+        signal.signal(signal.SIGTERM, stop_workers)
+        signal.signal(signal.SIGINT, stop_workers)
+        for pid in pids:
+            os.waitpid(pid, 0)
+
+    def start(self) -> None:
+        """Start the server and accept connections using a thread pool."""
+        if self.config.workers > 1 and hasattr(os, "fork"):
+            self._start_workers()
+        else:
+            self._accept_loop()
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
@@ -193,6 +503,17 @@ if __name__ == "__main__":
     )
     parser.add_argument("--certfile", type=str, help="Path to certificate file")
     parser.add_argument("--keyfile", type=str, help="Path to key file.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Number of worker processes (useful with --reread_on_query).",
+    )
+    parser.add_argument(
+        "--listen_fd",
+        type=int,
+        help="Accept on this inherited, already listening socket instead of "
+        "binding a port.",
+    )
 
     # verbosity based on the number of -v's, options are DEBUG, INFO, WARNING, ERROR, CRITICAL
     parser.add_argument(
@@ -240,9 +561,18 @@ if __name__ == "__main__":
             server_config.certfile = args.certfile
         if args.keyfile:
             server_config.keyfile = args.keyfile
+        if args.workers:
+            server_config.workers = args.workers
 
+        server_socket = None
+        if args.listen_fd is not None:
+            server_socket = socket.socket(fileno=args.listen_fd)
+            server_config.port = server_socket.getsockname()[1]
+            logger.info(
+                f"Using inherited listening socket on port {server_config.port}"
+            )
         # Find an available port if none was specified or if port from config is in use
-        if not (
+        elif not (
             args.port or (extra_server_config and extra_server_config.port)
         ):
             port = find_available_port(44445)
@@ -261,7 +591,9 @@ if __name__ == "__main__":
         logger.info(f"Using {search_algorithm.__class__.__name__} algorithm.")
 
         logger.info(f"Server configuration: {server_config}")
-        server = FileSearchServer(server_config, logger, search_algorithm)
+        server = FileSearchServer(
+            server_config, logger, search_algorithm, server_socket
+        )
         server.start()
     except Exception as e:
         logger.critical(f"Server failed to start: {e}")
@@ -2,15 +2,39 @@ import logging
 import os
 import random
 import socket
+import time
 from typing import Optional
 
+# A file modified this recently may be modified again without its mtime
+# moving (coarse filesystem timestamps), so caches keyed on the mtime
+# don't trust it yet.
+RACY_MTIME_WINDOW_NS = 2_000_000_000
+
 
 def generate_test_file(filepath: str, num_lines: int, logger: logging.Logger):
     """Generates a test file with random lines."""
     logger.debug(f"Generating test file: {filepath} with {num_lines} lines")
-    with open(filepath, "w") as f:
-        for _ in range(num_lines):
-            f.write(f"test string {random.randint(0, num_lines)}\n")
+    # One draw and one write for the whole file instead of per line
+    numbers = random.choices(range(num_lines + 1), k=num_lines)
+    with open(filepath, "wb") as f:
+        f.write(b"".join(map(b"test string %d\n".__mod__, numbers)))
+
+
+def mtime_is_racy(mtime_ns: int) -> bool:
+    """Whether a file with this mtime may change without the mtime moving."""
+    return time.time_ns() - mtime_ns < RACY_MTIME_WINDOW_NS
+
+
+def available_cpu_count() -> int:
+    """Number of CPUs this process may run on.
+
+    Unlike os.cpu_count(), respects CPU affinity (e.g. container cpusets)
+    where the platform exposes it.
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
 
 
 def check_file_exists(file_path: str) -> bool:
@@ -19,20 +43,26 @@ def check_file_exists(file_path: str) -> bool:
 
 
 def is_port_in_use(port: int) -> bool:
+    """Whether the server could not bind port right now.
+
+    Tries the bind the server itself does (with SO_REUSEADDR) rather than
+    connecting, so it takes no handshake, sees ports that are bound but
+    not listening yet, and doesn't count ports only held by connections
+    in TIME_WAIT.
+    """
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        return s.connect_ex(("localhost", port)) == 0
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            s.bind(("", port))
+        except OSError:
+            return True
+        return False
 
 
 def find_available_port(start_port: int, max_ports: int = 100) -> Optional[int]:
     """Find an available port. Returns None if all ports are taken."""
-    # Use a set to keep track of already tried ports for more efficient lookups.
-    tried_ports = set()
-    for _ in range(max_ports):
-        port = random.randint(
-            start_port, start_port + 1000
-        )  # Try ports within a limited range.
-        if port not in tried_ports:
-            if not is_port_in_use(port):
-                return port
-            tried_ports.add(port)
+    # Try ports within a limited range, in random order and without repeats.
+    for port in random.sample(range(start_port, start_port + 1001), max_ports):
+        if not is_port_in_use(port):
+            return port
     return None  # If all ports are taken.
@@ -2,15 +2,25 @@
 
 import argparse
 import csv
+import io
 import logging
 import multiprocessing
 import sys
-import time
-from concurrent.futures import ThreadPoolExecutor
-from typing import Dict, List
+import timeit
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+)
+from contextlib import ExitStack
+from functools import partial
+from typing import Dict, List, Sequence, Type
 
 from core.algorithms.aho_corasick_search import AhoCorasickSearch
+from core.algorithms.base import SearchAlgorithm
+from core.algorithms.binary_search import BinarySearch
 from core.algorithms.boyer_moore_search import BoyerMooreSearch
+from core.algorithms.bytes_search import BytesSearch
 from core.algorithms.linear_search import LinearSearch
 from core.algorithms.multiprocessing_search import MultiprocessingSearch
 from core.algorithms.rabin_karp_search import RabinKarpSearch
@@ -18,30 +28,91 @@ from core.algorithms.regex_search import RegexSearch
 from core.algorithms.set_search import SetSearch
 from core.config import ServerConfig
 from core.logger import setup_logger
-from core.utils import check_file_exists, generate_test_file
+from core.utils import (
+    available_cpu_count,
+    check_file_exists,
+    generate_test_file,
+)
+
+MAX_TASKS_PER_CHILD = 100
+LOGGER_NAME = "SpeedTestLogger"
+FIELDNAMES = (
+    "algorithm",
+    "query",
+    "num_runs",
+    "loops",
+    "avg_time",
+    "min_time",
+    "max_time",
+    "filepath",
+    "reread_on_query",
+)
+TIME_FIELDS = ("avg_time", "min_time", "max_time")
+
+# Algorithms that search within the calling process; these run inside the
+# speed test's worker pool.
+IN_PROCESS_ALGORITHMS = (
+    LinearSearch,
+    SetSearch,
+    BinarySearch,
+    AhoCorasickSearch,
+    RabinKarpSearch,
+    BoyerMooreSearch,
+    RegexSearch,
+    BytesSearch,
+)
+# Algorithms that start their own process pool. Pool workers are daemonic
+# and cannot have children, so these run in a separate process whose main
+# thread can safely fork the pool.
+POOLED_ALGORITHMS = (MultiprocessingSearch,)
 
 
 def run_speed_test(
     algorithm_instance, query: str, num_runs: int, logger: logging.Logger
 ) -> Dict:
-    """Runs a speed test for a given algorithm instance."""
+    """Runs a speed test for a given algorithm instance.
+
+    Each of the num_runs runs times `loops` back-to-back searches, with
+    loops picked by timeit's autorange so a run takes at least 0.2 s. The
+    times are per search.
+    """
     logger.debug(
-        f"Running speed test for {algorithm_instance.name}, query: {query}"
+        "Running speed test for %s, query: %s", algorithm_instance.name, query
     )
-    times = []
-    for _ in range(num_runs):
-        start_time = time.perf_counter()
-        algorithm_instance.search(query)
-        times.append(time.perf_counter() - start_time)
+    # autorange picks a loop count long enough to swamp timer overhead and
+    # doubles as the warm-up (e.g. regex compilation) for the measured runs.
+    timer = timeit.Timer(lambda: algorithm_instance.search(query))
+    loops, _ = timer.autorange()
+    times = [
+        total / loops for total in timer.repeat(repeat=num_runs, number=loops)
+    ]
 
-    valid_times = [t for t in times if t >= 0]
     return {
         "algorithm": algorithm_instance.name,
         "query": query,
         "num_runs": num_runs,
-        "avg_time": sum(valid_times) / len(valid_times) if valid_times else 0,
-        "min_time": min(valid_times) if valid_times else 0,
-        "max_time": max(valid_times) if valid_times else 0,
+        "loops": loops,
+        "avg_time": sum(times) / len(times) if times else 0,
+        "min_time": min(times) if times else 0,
+        "max_time": max(times) if times else 0,
+    }
+
+
+def run_reload_test(algorithm_instance, num_runs: int) -> Dict:
+    """Times `reload_data`, the extra work reread_on_query adds per search.
+
+    reload_data skips files that haven't changed since the last load, so
+    the recorded file state is cleared before every timed call to measure
+    a real reread rather than a single stat.
+    """
+    times = timeit.Timer(
+        algorithm_instance.reload_data,
+        setup=partial(setattr, algorithm_instance, "_file_state", None),
+    ).repeat(repeat=num_runs, number=1)
+    return {
+        "avg_time": sum(times) / len(times) if times else 0,
+        "min_time": min(times) if times else 0,
+        "max_time": max(times) if times else 0,
     }
 
 
@@ -50,18 +121,33 @@ def _collect_speed_test_data_single(
     filepath: str,
     queries: List[str],
     num_runs: int,
-    reread_on_query: bool,
+    reread_modes: Sequence[bool],
     logger: logging.Logger,
 ):
-    """Collect speed test data for a single algorithm instance."""
-    results = []
-    for query in queries:
-        results.append(
-            run_speed_test(algorithm_instance, query, num_runs, logger)
-            | {
-                "filepath": filepath,
-                "reread_on_query": reread_on_query,
-            }
+    """Collect speed test data for a single algorithm instance.
+
+    Searches are timed once with reread_on_query off. With it on, a search
+    is preceded by a reload, which rereads the file whenever it has changed
+    since the last load. The reread rows show that worst case: the cost of
+    a forced reread does not depend on the query, so its timings are added
+    to the search timings instead of re-running every query.
+    """
+    searches = [
+        run_speed_test(algorithm_instance, query, num_runs, logger)
+        for query in queries
+    ]
+    results: List[Dict] = []
+    for reread_on_query in reread_modes:
+        overhead = (
+            run_reload_test(algorithm_instance, num_runs)
+            if reread_on_query
+            else dict.fromkeys(TIME_FIELDS, 0)
+        )
+        results.extend(
+            search
+            | {field: search[field] + overhead[field] for field in TIME_FIELDS}
+            | {"filepath": filepath, "reread_on_query": reread_on_query}
+            for search in searches
         )
     return results
 
@@ -70,42 +156,43 @@ def collect_speed_test_data(
     filepath: str,
     queries: List[str],
     num_runs: int,
-    reread_on_query: bool,
+    reread_modes: Sequence[bool],
     logger: logging.Logger,
+    search_classes: Sequence[Type[SearchAlgorithm]] = (
+        IN_PROCESS_ALGORITHMS + POOLED_ALGORITHMS
+    ),
 ) -> List[Dict]:
-    """Collect speed test data for different algorithms in parallel."""
+    """Collect speed test data for different algorithms in parallel.
+
+    The algorithms are built once per file and reused for every reread
+    mode.
+    """
     config = ServerConfig(
         linux_path=filepath,
         port=0,
         ssl_enabled=False,
-        reread_on_query=reread_on_query,
+        reread_on_query=False,
     )
     algorithms = [
-        LinearSearch(config, logger),
-        SetSearch(config, logger),
-        AhoCorasickSearch(config, logger),
-        RabinKarpSearch(config, logger),
-        BoyerMooreSearch(config, logger),
-        RegexSearch(config, logger),
-        # Important: MultiprocessingSearch will run within the existing process here
-        MultiprocessingSearch(config, logger),
+        search_class(config, logger) for search_class in search_classes
     ]
 
-    with ThreadPoolExecutor() as executor:
-        futures = [
-            executor.submit(
-                _collect_speed_test_data_single,
-                alg,
-                filepath,
-                queries,
-                num_runs,
-                reread_on_query,
-                logger,
-            )
-            for alg in algorithms
+    collect = partial(
+        _collect_speed_test_data_single,
+        filepath=filepath,
+        queries=queries,
+        num_runs=num_runs,
+        reread_modes=reread_modes,
+        logger=logger,
+    )
+    with ThreadPoolExecutor(
+        max_workers=min(len(algorithms), available_cpu_count())
+    ) as executor:
+        return [
+            result
+            for alg_results in executor.map(collect, algorithms)
+            for result in alg_results
         ]
-        results = [result for future in futures for result in future.result()]
-    return results
 
 
 def save_test_data(data: List[Dict], output_path: str, logger: logging.Logger):
@@ -114,26 +201,35 @@ def save_test_data(data: List[Dict], output_path: str, logger: logging.Logger):
     if not data:
         logger.warning("No data to save.")
         return
+    fieldnames = list(data[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fieldnames)
+    writer.writerows([tuple(row[key] for key in fieldnames) for row in data])
     with open(output_path, "w", newline="") as csvfile:
-        fieldnames = data[0].keys()
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(data)
+        csvfile.write(buffer.getvalue())
 
 
 def _run_tests_for_file(
     filepath: str,
     queries: List[str],
     num_runs: int,
-    reread_on_query: bool,
-    logger: logging.Logger,
-):
-    """Helper function to run tests for a single file."""
+    reread_modes: Sequence[bool],
+    log_level: int,
+    search_classes: Sequence[Type[SearchAlgorithm]],
+) -> List[Dict]:
+    """Helper function to run tests for a single file.
+
+    Only the log level crosses the process boundary; the worker looks the
+    logger up by name instead of having it pickled with every task.
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(log_level)
     logger.info(
-        f"Starting tests for file: {filepath}, reread_on_query={reread_on_query}"
+        f"Starting tests for file: {filepath}, reread_on_query={reread_modes}"
     )
     return collect_speed_test_data(
-        filepath, queries, num_runs, reread_on_query, logger
+        filepath, queries, num_runs, reread_modes, logger, search_classes
     )
 
 
@@ -142,7 +238,10 @@ def main():
         description="Run speed tests and save results."
     )
     parser.add_argument(
-        "--force", action="store_true", help="Force overwrite existing files"
+        "--force",
+        "--yes",
+        action="store_true",
+        help="Force overwrite existing files without prompting",
     )
     parser.add_argument(
         "-v",
@@ -154,7 +253,7 @@ def main():
     args = parser.parse_args()
 
     logger = setup_logger(
-        name="SpeedTestLogger",
+        name=LOGGER_NAME,
         level={0: logging.WARNING, 1: logging.INFO, 2: logging.DEBUG}.get(
             args.verbose, logging.DEBUG
         ),
@@ -174,49 +273,86 @@ def main():
         False: "speed_test_data_reread_false.csv",
     }
 
-    # Generate test files in parallel
+    # Generate test files in parallel, largest first to shorten the tail
     with ThreadPoolExecutor() as executor:
-        futures = [
+        futures = {
             executor.submit(
-                generate_test_file,
-                filepath,
-                int(filepath.split("_")[-1].split(".")[0]),
-                logger,
+                generate_test_file, filepath, size, logger
+            ): filepath
+            for size, filepath in sorted(
+                zip(file_sizes, filepaths), reverse=True
             )
-            for filepath in filepaths
-        ]
-        for _ in futures:  # Wait for all files to be generated
-            pass
+        }
+        for future in as_completed(futures):
+            future.result()  # Surface generation errors before testing
+            logger.info(f"Generated test file: {futures[future]}")
 
     if not args.force:
         existing_files = [
             f for f in output_files.values() if check_file_exists(f)
         ]
-        if (
-            existing_files
-            and input(
-                f"Overwrite existing files? {existing_files} (y/n): "
-            ).lower()
-            == "n"
-        ):
-            logger.info("Aborting test.")
-            sys.exit()
-
-    all_test_data = []
-    with multiprocessing.Pool() as pool:
-        test_params = [
-            (filepath, queries, num_runs, reread, logger)
-            for filepath in filepaths
-            for reread in [True, False]
-        ]
-        results = pool.starmap(_run_tests_for_file, test_params)
-        all_test_data.extend(results)
+        if existing_files:
+            # Without a terminal to answer, don't hang; leave the files be.
+            answer = (
+                input(f"Overwrite existing files? {existing_files} (y/n): ")
+                if sys.stdin.isatty()
+                else "n"
+            )
+            if answer.lower() == "n":
+                logger.info("Aborting test.")
+                sys.exit()
 
-    for reread, output_file in output_files.items():
-        data_to_save = [
-            item for item in all_test_data if item["reread_on_query"] == reread
-        ]
-        save_test_data(data_to_save, output_file, logger)
+    run_tests = partial(
+        _run_tests_for_file,
+        queries=queries,
+        num_runs=num_runs,
+        reread_modes=tuple(output_files),
+        log_level=logger.level,
+    )
+    # Leave a core for the pooled algorithms, which fan out on their own.
+    num_workers = max(1, available_cpu_count() - 1)
+    with ExitStack() as stack:
+        # Rows are written as each file finishes rather than held until
+        # the whole sweep is done.
+        writers = {}
+        for reread, output_file in output_files.items():
+            logger.info(f"Saving test data to: {output_file}")
+            csvfile = stack.enter_context(open(output_file, "w", newline=""))
+            writers[reread] = csv.writer(csvfile)
+            writers[reread].writerow(FIELDNAMES)
+
+        def write_results(results: List[Dict]) -> None:
+            for row in results:
+                writers[row["reread_on_query"]].writerow(
+                    [row[key] for key in FIELDNAMES]
+                )
+
+        # A forkserver child starts without the parent's threads, so the
+        # pools it forks can't inherit a lock some other thread held.
+        pooled_executor = stack.enter_context(
+            ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context("forkserver"),
+                initializer=setup_logger,
+                initargs=(LOGGER_NAME, logger.level),
+            )
+        )
+        pooled_results = pooled_executor.map(
+            partial(run_tests, search_classes=POOLED_ALGORITHMS), filepaths
+        )
+        # Recycle workers so long sweeps don't accumulate memory in a
+        # single child.
+        with multiprocessing.Pool(
+            processes=num_workers, maxtasksperchild=MAX_TASKS_PER_CHILD
+        ) as pool:
+            worker = partial(run_tests, search_classes=IN_PROCESS_ALGORITHMS)
+            chunksize = max(1, len(filepaths) // (4 * num_workers))
+            for results in pool.imap_unordered(
+                worker, filepaths, chunksize=chunksize
+            ):
+                write_results(results)
+        for results in pooled_results:
+            write_results(results)
 
     logger.info("Speed test complete")
 
@@ -1,4 +1,7 @@
 import logging
+import os
+import threading
+import time
 from unittest.mock import MagicMock
 from copy import deepcopy
 
@@ -6,14 +9,49 @@ import pytest
 
 from core.algorithms.aho_corasick_search import AhoCorasickSearch
 from core.algorithms.base import SearchAlgorithm
+from core.algorithms.binary_search import BinarySearch
 from core.algorithms.boyer_moore_search import BoyerMooreSearch
+from core.algorithms.bytes_search import BytesSearch
 from core.algorithms.linear_search import LinearSearch
 from core.algorithms.multiprocessing_search import MultiprocessingSearch
 from core.algorithms.rabin_karp_search import RabinKarpSearch
-from core.algorithms.regex_search import RegexSearch
+from core.algorithms.regex_search import RegexSearch, _compile
 from core.algorithms.set_search import SetSearch
 from core.config import ServerConfig
 
+ALGORITHMS = [
+    LinearSearch,
+    SetSearch,
+    BinarySearch,
+    AhoCorasickSearch,
+    RabinKarpSearch,
+    BoyerMooreSearch,
+    RegexSearch,
+    MultiprocessingSearch,
+    BytesSearch,
+]
+
+
+@pytest.fixture(scope="module", params=ALGORITHMS, ids=lambda x: x.name)
+def searcher(request):
+    """A searcher per algorithm, built once per module with in-memory data."""
+    config = ServerConfig(
+        linux_path="dummy_path.txt",
+        port=1234,
+        ssl_enabled=False,
+        reread_on_query=False,
+    )
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(SearchAlgorithm, "reload_data", MagicMock())
+        searcher = request.param(config, logging.getLogger("test_logger"))
+    lines = ["test string 1", "test string 2"]
+    if isinstance(searcher, BytesSearch):
+        # BytesSearch keeps the file as one newline-delimited bytes object
+        searcher._data = ("\n" + "\n".join(lines) + "\n").encode()
+    else:
+        searcher._data = lines
+    return searcher
+
 
 @pytest.fixture
 def dummy_config():
@@ -34,42 +72,11 @@ def dummy_logger():
     return logger
 
 
-@pytest.mark.parametrize(
-    "search_class",
-    [
-        LinearSearch,
-        SetSearch,
-        AhoCorasickSearch,
-        RabinKarpSearch,
-        BoyerMooreSearch,
-        RegexSearch,
-        MultiprocessingSearch,
-    ],
-    ids=lambda x: x.name,
-)
-def test_search_string_exists(
-    search_class, dummy_config, dummy_logger, monkeypatch
-):
-    monkeypatch.setattr(SearchAlgorithm, "reload_data", MagicMock())
-    lines = ["test string 1", "test string 2"]
-    searcher = search_class(dummy_config, dummy_logger)
-    searcher._data = lines  # Directly set data for simplicity
+def test_search_string_exists(searcher):
     assert searcher.search("test string 1") is True
 
 
-@pytest.mark.parametrize(
-    "search_class",
-    [
-        LinearSearch,
-        SetSearch,
-        AhoCorasickSearch,
-        RabinKarpSearch,
-        BoyerMooreSearch,
-        RegexSearch,
-        MultiprocessingSearch,
-    ],
-    ids=lambda x: x.name,
-)
+@pytest.mark.parametrize("search_class", ALGORITHMS, ids=lambda x: x.name)
 def test_search_string_exists_with_file(
     search_class, dummy_config: ServerConfig, dummy_logger, tmp_path
 ):
@@ -82,30 +89,11 @@ def test_search_string_exists_with_file(
     new_dummy_config = deepcopy(dummy_config)
     new_dummy_config.linux_path = str(test_file)
     searcher = search_class(new_dummy_config, dummy_logger)
-    searcher._data = lines  # Directly set data for simplicity
     assert searcher.search("test string 1") is True
+    assert searcher.search("non existing query") is False
 
 
-@pytest.mark.parametrize(
-    "search_class",
-    [
-        LinearSearch,
-        SetSearch,
-        AhoCorasickSearch,
-        RabinKarpSearch,
-        BoyerMooreSearch,
-        RegexSearch,
-        MultiprocessingSearch,
-    ],
-    ids=lambda x: x.name,
-)
-def test_search_string_not_found(
-    search_class, dummy_config, dummy_logger, monkeypatch
-):
-    monkeypatch.setattr(SearchAlgorithm, "reload_data", MagicMock())
-    lines = ["test string 1", "test string 2"]
-    searcher = search_class(dummy_config, dummy_logger)
-    searcher._data = lines  # Directly set data for simplicity
+def test_search_string_not_found(searcher):
     assert searcher.search("non existing query") is False
 
 
@@ -130,6 +118,18 @@ def test_regex_search_regex_no_match(dummy_config, dummy_logger, monkeypatch):
     assert searcher.search(r"non matching regex") is False
 
 
+def test_regex_search_compiles_pattern_once(
+    dummy_config, dummy_logger, monkeypatch
+):
+    monkeypatch.setattr(SearchAlgorithm, "reload_data", MagicMock())
+    searcher = RegexSearch(dummy_config, dummy_logger)
+    searcher._data = ["test string 1", "test string 22"]
+    _compile.cache_clear()
+    for _ in range(3):
+        assert searcher.search(r"test string \d+") is True
+    assert _compile.cache_info().misses == 1
+
+
 # Test reread_on_query functionality
 def test_linear_search_reread_on_query(dummy_config, dummy_logger, tmp_path):
     # Create a dummy file
@@ -158,6 +158,24 @@ def test_linear_search_reread_on_query(dummy_config, dummy_logger, tmp_path):
     assert searcher.search("initial content") is False
 
 
+def test_reread_on_query_skips_unchanged_file(dummy_logger, tmp_path):
+    file_path = tmp_path / "test_file.txt"
+    file_path.write_text("initial content\n")
+    # Age the file out of the racy-mtime window so it may be cached.
+    old = time.time_ns() - 10 * 1_000_000_000
+    os.utime(file_path, ns=(old, old))
+    config = ServerConfig(linux_path=str(file_path), reread_on_query=True)
+
+    searcher = LinearSearch(config, dummy_logger)
+    searcher._read_data = MagicMock(wraps=searcher._read_data)
+    assert searcher.search("initial content") is True
+    assert searcher._read_data.call_count == 0
+
+    file_path.write_text("updated content\n")
+    assert searcher.search("updated content") is True
+    assert searcher._read_data.call_count == 1
+
+
 def test_linear_search_file_not_found(dummy_config, dummy_logger):
     config = ServerConfig(
         linux_path="non_existent_file.txt",
@@ -185,3 +203,76 @@ def test_linear_search_file_read_error(dummy_config, dummy_logger, tmp_path):
     )
     with pytest.raises(SystemExit):
         LinearSearch(config, dummy_logger)
+
+
+def test_binary_search_unsorted_file(dummy_config, dummy_logger, tmp_path):
+    file_path = tmp_path / "test_file.txt"
+    with open(file_path, "w") as f:
+        f.write("zebra\napple\nmango\n")
+
+    config = deepcopy(dummy_config)
+    config.linux_path = str(file_path)
+    searcher = BinarySearch(config, dummy_logger)
+    assert searcher.search("apple") is True
+    assert searcher.search("zebra") is True
+    assert searcher.search("banana") is False
+
+
+def test_bytes_search_matches_whole_lines(dummy_config, dummy_logger, tmp_path):
+    file_path = tmp_path / "test_file.txt"
+    # No trailing newline, and one CRLF line ending
+    file_path.write_bytes(b"first line\r\ntest string 1\nlast line")
+
+    config = deepcopy(dummy_config)
+    config.linux_path = str(file_path)
+    searcher = BytesSearch(config, dummy_logger)
+    assert searcher.search("first line") is True
+    assert searcher.search("test string 1") is True
+    assert searcher.search("last line") is True
+    assert searcher.search("test string") is False
+    assert searcher.search("string 1") is False
+
+
+@pytest.mark.parametrize(
+    "search_class", [LinearSearch, SetSearch, BytesSearch], ids=lambda x: x.name
+)
+def test_whole_line_searches_agree_on_edge_cases(
+    search_class, dummy_config, dummy_logger, tmp_path
+):
+    file_path = tmp_path / "test_file.txt"
+    file_path.write_text("test string 1\ntest string 2\n")
+
+    config = deepcopy(dummy_config)
+    config.linux_path = str(file_path)
+    searcher = search_class(config, dummy_logger)
+    # The final newline ends the last line rather than starting an empty one
+    assert searcher.search("") is False
+    assert searcher.search("test string 1\ntest string 2") is False
+    assert searcher.search("non existing query") is False
+
+
+def test_set_search_reload_while_searching(
+    dummy_config, dummy_logger, tmp_path
+):
+    file_path = tmp_path / "test_file.txt"
+    with open(file_path, "w") as f:
+        f.write("\n".join(f"line {i}" for i in range(10000)))
+
+    config = deepcopy(dummy_config)
+    config.linux_path = str(file_path)
+    searcher = SetSearch(config, dummy_logger)
+
+    stop = threading.Event()
+
+    def reload_loop():
+        while not stop.is_set():
+            searcher.reload_data()
+
+    reloader = threading.Thread(target=reload_loop)
+    reloader.start()
+    try:
+        results = [searcher.search("line 9999") for _ in range(2000)]
+    finally:
+        stop.set()
+        reloader.join()
+    assert all(results)
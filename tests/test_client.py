@@ -1,9 +1,25 @@
+import asyncio
+import os
+import shutil
+import socket
+import textwrap
+from unittest import mock
+
 import pytest
 
-from core.client import ClientConfig, client_query
+from core.client import (
+    ClientConfig,
+    ClientSession,
+    _resolve,
+    _ssl_context,
+    async_client_query,
+    client_query,
+    client_query_many,
+)
 from tests.utils import (
     create_test_client_process,
     create_test_data,
+    drain_stderr,
     server_factory,
 )
 
@@ -14,77 +30,76 @@ def default_test_state(data_file):
 
 
 @pytest.fixture()
-def config_file(tmp_path, data_file):
-    config_file = tmp_path / "test_client_config.ini"
-    with open(config_file, "w") as f:
-        f.write("[Client]\n")
-        f.write("server=127.0.0.1\n")
-        # linuxpath: intentionally put it in this place
-        # so that server can read it as a valid "ordinary" config
-        f.write(f"linuxpath={data_file}\n")
-        f.write("query=test query default\n")
+def config_file(data_file):
+    config_file = data_file.parent / "test_client_config.ini"
+    # linuxpath: intentionally put it in this place
+    # so that server can read it as a valid "ordinary" config
+    config_file.write_text(
+        textwrap.dedent(
+            f"""\
+            [Client]
+            server=127.0.0.1
+            linuxpath={data_file}
+            query=test query default
+            """
+        )
+    )
     return config_file
 
 
-def test_client_query_success(config_file, default_test_state):
-    server_process, port, _ = server_factory(config_file)
-    config = ClientConfig(server="127.0.0.1", port=port, query="test string 1")
+def test_client_query_success(server):
+    config = ClientConfig(
+        server="127.0.0.1", port=server, query="test string 1"
+    )
     response = client_query(config)
     assert "STRING" in response
-    server_process.terminate()
 
 
-def test_client_query_string_not_found(
-    config_file, data_file, default_test_state
-):
-    server_process, port, _ = server_factory(config_file)
+def test_client_query_string_not_found(server):
     config = ClientConfig(
-        server="127.0.0.1", port=port, query="non existing query"
+        server="127.0.0.1", port=server, query="non existing query"
     )
     response = client_query(config)
     assert response == "STRING NOT FOUND"
-    server_process.terminate()
 
 
-def test_client_query_server_error(config_file, data_file, default_test_state):
-    server_process, port, _ = server_factory(config_file)
-    config = ClientConfig(
-        server="127.0.0.1", port=port + 1, query="test query"
-    )  # Use the next port
-    response = client_query(config)
-    assert "Error" in response
-    server_process.terminate()
+def test_client_session_reuses_connection(server):
+    config = ClientConfig(server="127.0.0.1", port=server, query="")
+    with ClientSession(config) as session:
+        assert session.query("test string 1") == "STRING EXISTS"
+        sock = session.sock
+        assert session.query("non existing query") == "STRING NOT FOUND"
+        assert session.query("test string 2") == "STRING EXISTS"
+        assert session.sock is sock
+    assert session.sock is None
 
 
-def test_client_ssl_no_certificate(config_file, ssl_files, default_test_state):
-    server_process, port, _ = server_factory(
-        config_file, ssl_enabled=True, ssl_files=ssl_files
-    )
+def test_client_query_server_error(server):
     config = ClientConfig(
-        server="127.0.0.1", port=port, query="test string 1", ssl_enabled=True
-    )
+        server="127.0.0.1", port=server + 1, query="test query"
+    )  # Use the next port
     response = client_query(config)
     assert "Error" in response
-    server_process.terminate()
 
 
-def test_client_default_config(config_file, default_test_state):
-    server_process, port, _ = server_factory(config_file)
+def test_client_default_config(config_file, server):
     # Call the client without --client_config and ensure
     # it works using default values, except for the query.
     process = create_test_client_process(
-        config_file=config_file, query="test string 1", port=port
+        config_file=config_file, query="test string 1", port=server
     )
     assert "Using default client configuration" in process.stderr
     assert "Server Response: STRING" in process.stderr
-    server_process.terminate()
 
 
 def test_client_commandline_parameters_override(
     ssl_files, config_file, tmp_path, default_test_state
 ):
     server_process, port, cert_file = server_factory(
-        config_file, ssl_enabled=True, ssl_files=ssl_files
+        config_file,
+        ssl_enabled=True,
+        ssl_files=ssl_files,
+        capture_stderr=False,
     )
 
     new_cert = tmp_path / "new_cert.pem"
@@ -93,13 +108,18 @@ def test_client_commandline_parameters_override(
         dst.write(src.read())
     # Create a client config file
     config_file = tmp_path / "test_client_config.ini"
-    with config_file.open("w") as f:
-        f.write("[Client]\n")
-        f.write("server=127.0.0.1\n")
-        f.write(f"port={port-1}\n")
-        f.write("query=test query config\n")
-        f.write("ssl_enabled=False\n")
-        f.write(f"cert_file={new_cert}\n")
+    config_file.write_text(
+        textwrap.dedent(
+            f"""\
+            [Client]
+            server=127.0.0.1
+            port={port-1}
+            query=test query config
+            ssl_enabled=False
+            cert_file={new_cert}
+            """
+        )
+    )
     process = create_test_client_process(
         config_file,
         "test override",
@@ -115,3 +135,87 @@ def test_client_commandline_parameters_override(
         in process.stderr
     )
     server_process.terminate()
+    drain_stderr(server_process)
+
+
+def test_client_query_many(server):
+    config = ClientConfig(server="127.0.0.1", port=server, query="")
+    responses = client_query_many(
+        config, ["test string 1", "missing", "test string 2"]
+    )
+    assert responses == ["STRING EXISTS", "STRING NOT FOUND", "STRING EXISTS"]
+
+
+def test_client_query_many_connection_error():
+    config = ClientConfig(server="127.0.0.1", port=1, query="")
+    responses = client_query_many(config, ["a", "b"])
+    assert len(responses) == 2
+    assert all(response.startswith("Error:") for response in responses)
+
+
+def test_async_client_query(server):
+    config = ClientConfig(
+        server="127.0.0.1", port=server, query="test string 2"
+    )
+    assert asyncio.run(async_client_query(config)) == "STRING EXISTS"
+
+
+def test_async_client_query_server_error(server):
+    config = ClientConfig(server="127.0.0.1", port=server + 1, query="test")
+    assert asyncio.run(async_client_query(config)).startswith("Error:")
+
+
+def test_resolve_caches_only_literal_addresses():
+    address = [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("10.0.0.1", 80))]
+    with mock.patch.object(
+        socket, "getaddrinfo", return_value=address
+    ) as getaddrinfo:
+        _resolve("192.0.2.7", 80)
+        _resolve("192.0.2.7", 80)
+        assert getaddrinfo.call_count == 1
+        _resolve("server.example", 80)
+        _resolve("server.example", 80)
+        assert getaddrinfo.call_count == 3
+
+
+def test_ssl_context_reused_until_cert_changes(ssl_files, tmp_path):
+    cert_file = tmp_path / "server.crt"
+    shutil.copy(ssl_files[0], cert_file)
+    mtime_ns = cert_file.stat().st_mtime_ns - 10_000_000_000
+    os.utime(cert_file, ns=(mtime_ns, mtime_ns))
+    context = _ssl_context(str(cert_file))
+    assert _ssl_context(str(cert_file)) is context
+
+    mtime_ns += 1_000_000_000
+    os.utime(cert_file, ns=(mtime_ns, mtime_ns))
+    assert _ssl_context(str(cert_file)) is not context
+
+
+def test_ssl_context_not_reused_for_fresh_cert(ssl_files, tmp_path):
+    cert_file = tmp_path / "server.crt"
+    shutil.copy(ssl_files[0], cert_file)
+    # Just written, so a same-size rewrite might not move the mtime
+    assert _ssl_context(str(cert_file)) is not _ssl_context(str(cert_file))
+
+
+def test_tls_session_resumed_by_next_connection(
+    ssl_server, ssl_files, tmp_path
+):
+    # Sessions are only resumed with the same (cached) context, and a
+    # freshly written certificate isn't cached yet
+    cert_file = tmp_path / "server.crt"
+    shutil.copy(ssl_files[0], cert_file)
+    mtime_ns = cert_file.stat().st_mtime_ns - 10_000_000_000
+    os.utime(cert_file, ns=(mtime_ns, mtime_ns))
+    config = ClientConfig(
+        server="localhost",
+        port=ssl_server,
+        query="test string 1",
+        ssl_enabled=True,
+        cert_file=str(cert_file),
+    )
+    with ClientSession(config) as first:
+        assert first.query(config.query) == "STRING EXISTS"
+    with ClientSession(config) as second:
+        assert second.query(config.query) == "STRING EXISTS"
+        assert second.sock.session_reused
@@ -1,5 +1,9 @@
+import configparser
+import os
 import pytest
 import logging
+import time
+from unittest import mock
 from core.config import (
     load_server_config,
     load_extra_server_config,
@@ -12,6 +16,11 @@ def logger():
     return logging.getLogger("TestLogger")
 
 
+def logged(caplog, prefix):
+    """Whether any captured record's message starts with prefix."""
+    return any(r.getMessage().startswith(prefix) for r in caplog.records)
+
+
 def test_load_server_config_valid(tmp_path, logger):
     config_file = tmp_path / "server_config.ini"
     config_file.write_text("linuxpath=test_data.txt\n")
@@ -20,26 +29,24 @@ def test_load_server_config_valid(tmp_path, logger):
     assert config.linux_path == "test_data.txt"
 
 
-def test_load_server_config_missing_linuxpath(tmp_path, logger, caplog):
+@pytest.mark.parametrize(
+    "content,expected_msg",
+    [
+        ("", "Config file must have a linuxpath line."),
+        (None, "Error reading config file"),
+        ("\n\n", "Config file must have a linuxpath line."),
+    ],
+    ids=["missing_linuxpath", "invalid_file", "empty_file"],
+)
+def test_load_server_config_errors(
+    tmp_path, logger, caplog, content, expected_msg
+):
     config_file = tmp_path / "server_config.ini"
-    config_file.write_text("")
+    if content is not None:
+        config_file.write_text(content)
     with pytest.raises(SystemExit):
         load_server_config(str(config_file), logger)
-    assert "Config file must have a linuxpath line." in caplog.text
-
-
-def test_load_server_config_invalid_file(logger, caplog):
-    with pytest.raises(SystemExit):
-        load_server_config("non_existent_config.ini", logger)
-    assert "Error reading config file" in caplog.text
-
-
-def test_load_server_config_empty_file(tmp_path, logger, caplog):
-    config_file = tmp_path / "empty_config.ini"
-    config_file.write_text("")
-    with pytest.raises(SystemExit):
-        load_server_config(str(config_file), logger)
-    assert "Config file must have a linuxpath line." in caplog.text
+    assert logged(caplog, expected_msg)
 
 
 def test_load_extra_server_config_valid(tmp_path, logger):
@@ -57,26 +64,24 @@ def test_load_extra_server_config_valid(tmp_path, logger):
     assert config.keyfile == "test.key"
 
 
-def test_load_extra_server_config_missing_section(tmp_path, logger, caplog):
-    config_file = tmp_path / "extra_server_config.ini"
-    config_file.write_text("[Other]\ntest=value\n")
-    config = load_extra_server_config(str(config_file), logger)
-    assert config is None
-    assert "Config file must have a [Server] section." in caplog.text
-
-
-def test_load_extra_server_config_invalid_file(logger, caplog):
-    config = load_extra_server_config("non_existent_config.ini", logger)
-    assert config is None
-    assert "Error reading extra server config file" in caplog.text
-
-
-def test_load_extra_server_config_invalid_values(tmp_path, logger, caplog):
+@pytest.mark.parametrize(
+    "content,expected_msg",
+    [
+        ("[Other]\ntest=value\n", "Config file must have a [Server] section."),
+        (None, "Error reading extra server config file"),
+        ("[Server]\nport=abc\n", "Error parsing server config"),
+    ],
+    ids=["missing_section", "invalid_file", "invalid_values"],
+)
+def test_load_extra_server_config_errors(
+    tmp_path, logger, caplog, content, expected_msg
+):
     config_file = tmp_path / "extra_server_config.ini"
-    config_file.write_text("[Server]\nport=abc\n")
+    if content is not None:
+        config_file.write_text(content)
     config = load_extra_server_config(str(config_file), logger)
     assert config is None
-    assert "Error parsing server config" in caplog.text
+    assert logged(caplog, expected_msg)
 
 
 def test_load_client_config_valid(tmp_path, logger):
@@ -95,28 +100,41 @@ def test_load_client_config_valid(tmp_path, logger):
     assert config.cert_file == "test_client.crt"
 
 
-def test_load_client_config_missing_section(tmp_path, logger, caplog):
-    config_file = tmp_path / "client_config.ini"
-    config_file.write_text("[Other]\ntest=value\n")
-    config = load_client_config(str(config_file), logger)
-    assert config is None
-    assert "Config file must have a [Client] section." in caplog.text
-
-
-def test_load_client_config_invalid_file(logger, caplog):
-    config = load_client_config("non_existent_config.ini", logger)
-    assert config is None
-    assert "Error reading client config file" in caplog.text
-
-
-def test_load_client_config_invalid_values(tmp_path, logger, caplog):
+@pytest.mark.parametrize(
+    "content,expected_msg",
+    [
+        ("[Other]\ntest=value\n", "Config file must have a [Client] section."),
+        (None, "Error reading client config file"),
+        (
+            "[Client]\nport=abc\nquery=test\n",
+            "Error parsing client config: invalid literal for int()",
+        ),
+        (
+            "[Client]\nserver=127.0.0.1\nport=8080\n",
+            "Missing required option in config file",
+        ),
+        (
+            "[Client]\nserver=127.0.0.1\nquery=test\n",
+            "Missing required option in config file",
+        ),
+    ],
+    ids=[
+        "missing_section",
+        "invalid_file",
+        "invalid_values",
+        "missing_query",
+        "missing_port",
+    ],
+)
+def test_load_client_config_errors(
+    tmp_path, logger, caplog, content, expected_msg
+):
     config_file = tmp_path / "client_config.ini"
-    config_file.write_text("[Client]\nport=abc\nquery=test\n")
+    if content is not None:
+        config_file.write_text(content)
     config = load_client_config(str(config_file), logger)
     assert config is None
-    assert (
-        "Error parsing client config: invalid literal for int()" in caplog.text
-    )
+    assert logged(caplog, expected_msg)
 
 
 def test_load_client_config_missing_server(tmp_path, logger):
@@ -135,17 +153,56 @@ def test_load_client_config_missing_server(tmp_path, logger):
     assert config.cert_file == "test_client.crt"
 
 
-def test_load_client_config_missing_query(tmp_path, logger, caplog):
+def test_load_client_config_missing_optional_values(tmp_path, logger):
     config_file = tmp_path / "client_config.ini"
-    config_file.write_text("[Client]\nserver=127.0.0.1\nport=8080\n")
+    config_file.write_text(
+        "[Client]\nserver=127.0.0.1\nport=8080\nquery=test\n"
+    )
     config = load_client_config(str(config_file), logger)
-    assert config is None
-    assert "Missing required option in config file" in caplog.text
+    assert config is not None
+    assert config.ssl_enabled is False
+    assert config.cert_file is None
+
+
+def _write_settled(config_file, text):
+    """Writes text with an mtime old enough for the config cache to trust."""
+    config_file.write_text(text)
+    mtime_ns = time.time_ns() - 10_000_000_000
+    os.utime(config_file, ns=(mtime_ns, mtime_ns))
 
 
-def test_load_client_config_missing_port(tmp_path, logger, caplog):
+def test_load_client_config_cached_until_file_changes(tmp_path, logger):
     config_file = tmp_path / "client_config.ini"
-    config_file.write_text("[Client]\nserver=127.0.0.1\nquery=test\n")
-    config = load_client_config(str(config_file), logger)
-    assert config is None
-    assert "Missing required option in config file" in caplog.text
+    _write_settled(config_file, "[Client]\nport=8080\nquery=first\n")
+    read = configparser.ConfigParser.read
+    with mock.patch.object(
+        configparser.ConfigParser, "read", autospec=True, side_effect=read
+    ) as parser_read:
+        first = load_client_config(str(config_file), logger)
+        second = load_client_config(str(config_file), logger)
+        assert first is second
+        assert parser_read.call_count == 1
+
+        _write_settled(config_file, "[Client]\nport=8080\nquery=second\n")
+        assert load_client_config(str(config_file), logger).query == "second"
+        assert parser_read.call_count == 2
+
+
+def test_load_client_config_sees_same_size_rewrite(tmp_path, logger):
+    config_file = tmp_path / "client_config.ini"
+    config_file.write_text("[Client]\nport=8080\nquery=test\n")
+    mtime_ns = config_file.stat().st_mtime_ns
+    assert load_client_config(str(config_file), logger).port == 8080
+
+    # Same size and, as on a coarse-timestamp filesystem, the same mtime
+    config_file.write_text("[Client]\nport=8081\nquery=test\n")
+    os.utime(config_file, ns=(mtime_ns, mtime_ns))
+    assert load_client_config(str(config_file), logger).port == 8081
+
+
+def test_load_server_config_returns_a_copy(tmp_path, logger):
+    config_file = tmp_path / "server_config.ini"
+    _write_settled(config_file, "linuxpath=/tmp/data.txt\n")
+    first = load_server_config(str(config_file), logger)
+    first.reread_on_query = not first.reread_on_query
+    assert load_server_config(str(config_file), logger) != first
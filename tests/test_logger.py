@@ -10,3 +10,11 @@ def test_setup_logger_default():
 def test_setup_logger_custom_name():
     logger = setup_logger(name="CustomLogger")
     assert logger.name == "CustomLogger"
+
+
+def test_setup_logger_idempotent():
+    logger = setup_logger(name="IdempotentLogger")
+    handlers = list(logger.handlers)
+    assert setup_logger(name="IdempotentLogger", level=logging.DEBUG) is logger
+    assert logger.handlers == handlers
+    assert all(h.level == logging.DEBUG for h in logger.handlers)
@@ -1,87 +1,222 @@
+import asyncio
 import logging
-import threading
+import socket
+import textwrap
 import time
 from pathlib import Path
+from unittest import mock
 
 import pytest
 
-from core.client import ClientConfig, client_query
-from core.server import DEFAULT_SEARCH
+from core.client import (
+    PIPELINE_DEPTH,
+    ClientConfig,
+    ClientSession,
+    async_client_query,
+    client_query,
+    client_query_many,
+)
+from core.config import ServerConfig
+from core.server import (
+    DEFAULT_SEARCH,
+    MAX_WORKERS,
+    PAYLOAD_SIZE,
+    FileSearchServer,
+)
+from core.utils import available_cpu_count
 from tests.utils import (
     create_test_config_for_server,
     create_test_data,
+    drain_stderr,
+    run_server_cli,
     server_factory,
+    wait_for_log,
+    wait_for_server_shutdown,
+    worker_free_port,
 )
 
 
 @pytest.fixture(scope="function")
 def config_file(config_file, data_file):
-    with open(config_file, "w") as f:
-        f.write("[Server]\n")
-        f.write("server=127.0.0.1\n")
-        f.write(f"linuxpath={data_file}\n")
-        f.write("reread_on_query=False")
+    config_file.write_text(
+        textwrap.dedent(
+            f"""\
+            [Server]
+            server=127.0.0.1
+            linuxpath={data_file}
+            reread_on_query=False
+            """
+        )
+    )
     return config_file
 
 
-def test_server_string_exists(config_file, data_file):
-    create_test_data(data_file, ["test string 1", "test string 2"])
-    server_process, port, _ = server_factory(config_file=config_file)
-    config = ClientConfig(server="127.0.0.1", port=port, query="test string 1")
-    response = client_query(config)
-    assert "STRING" in response
-    server_process.terminate()
-
-
-def test_server_string_not_found(config_file, data_file):
-    create_test_data(
-        data_file, ["test string 1", "test string 2", "test query override"]
+# The longest query the server reads, and one it has to truncate to that
+FULL_PAYLOAD = "A" * PAYLOAD_SIZE
+OVERSIZED_QUERY = "A" * (2 * PAYLOAD_SIZE)
+# What the server logs when it falls back to its default search
+USING_DEFAULT_SEARCH = f"Using {DEFAULT_SEARCH.__name__} algorithm.".encode()
+# The server gives each new connection CLIENT_SOCKET_TIMEOUT (5 ms) to
+# send its query, and answers "STRING NOT FOUND" (or resets the
+# connection) if the query arrives later. With the client and the server
+# sharing few CPUs, either can sit unscheduled for longer than that while
+# many connections are open, so the concurrency tested scales with the
+# CPUs: 16 connections at once with four or more.
+MAX_CONCURRENT_QUERIES = min(16, 4 * available_cpu_count())
+
+SHARED_DATA = [
+    "test string 1",
+    "test string 2",
+    "test query override",
+    "你好，世界",
+    "~!@#$%^&*()_+=-`",
+]
+
+
+def _shared_server(tmp_path_factory, workers=None):
+    tmp_dir = tmp_path_factory.mktemp("shared_server")
+    data_file = tmp_dir / "data.txt"
+    config_file = tmp_dir / "config.ini"
+    create_test_data(data_file, SHARED_DATA)
+    config_file.write_text(
+        f"[Server]\nlinuxpath={data_file}\nreread_on_query=False\n"
     )
-    server_process, port, _ = server_factory(config_file=config_file)
-    config = ClientConfig(
-        server="127.0.0.1", port=port, query="non existing string"
+    server_process, port, _ = server_factory(
+        config_file=config_file,
+        verbosity=logging.ERROR,
+        workers=workers,
+        capture_stderr=False,
     )
-    response = client_query(config)
-    assert response == "STRING NOT FOUND"
+    yield server_process, port
     server_process.terminate()
+    server_process.wait()
+
+
+@pytest.fixture(scope="module")
+def shared_server(tmp_path_factory):
+    """A server process shared by the tests that only query SHARED_DATA.
+
+    Yields (process, port). Its stderr is discarded, and it logs only
+    errors so the thousands of queries it serves don't each write a line.
+    """
+    yield from _shared_server(tmp_path_factory)
+
+
+@pytest.fixture(scope="module")
+def shared_worker_server(tmp_path_factory):
+    """Like shared_server, but with four worker processes.
+
+    Each worker accepts on its own SO_REUSEPORT socket, so the kernel
+    spreads connections across their accept queues.
+    """
+    yield from _shared_server(tmp_path_factory, workers=4)
+
+
+@pytest.mark.parametrize(
+    "query,expected",
+    [
+        ("test string 1", "STRING EXISTS"),
+        ("non existing string", "STRING NOT FOUND"),
+        # Only whole lines match
+        ("test string", "STRING NOT FOUND"),
+        ("", "STRING NOT FOUND"),
+        ("test string 1\x00\x00", "STRING EXISTS"),
+        ("你好，世界", "STRING EXISTS"),
+        ("~!@#$%^&*()_+=-`", "STRING EXISTS"),
+    ],
+    ids=[
+        "exists",
+        "not_found",
+        "partial_match",
+        "empty_query",
+        "strips_null_characters",
+        "unicode",
+        "special_characters",
+    ],
+)
+def test_server_string_match(shared_server, query, expected):
+    _, port = shared_server
+    config = ClientConfig(server="127.0.0.1", port=port, query=query)
+    response = client_query(config)
+    assert response == expected
 
 
-def test_server_string_partial_match(config_file, data_file):
-    create_test_data(data_file, ["test string part"])
-    server_process, port, _ = server_factory(config_file=config_file)
-    config = ClientConfig(server="127.0.0.1", port=port, query="test string")
-    response = client_query(config)
-    assert response == "STRING NOT FOUND"
-    server_process.terminate()
+def test_server_keep_alive_queries(shared_server):
+    _, port = shared_server
+    with socket.create_connection(("127.0.0.1", port), timeout=3) as sock:
+        sock.sendall(b"test string 1\nnon existing string\n")
+        response = b""
+        while response.count(b"\n") < 2:
+            response += sock.recv(1024)
+        sock.sendall(b"test string 2\n")
+        second = sock.recv(1024)
+
+    assert response == b"STRING EXISTS\nSTRING NOT FOUND\n"
+    assert second == b"STRING EXISTS\n"
+
+
+def test_server_idle_sessions_dont_hold_pool_threads(
+    threaded_server, data_file
+):
+    create_test_data(data_file, ["test string 1"])
+    port = threaded_server(ServerConfig(linux_path=str(data_file)))
+    config = ClientConfig(server="127.0.0.1", port=port, query="test string 1")
+    sessions = [ClientSession(config) for _ in range(MAX_WORKERS)]
+    try:
+        # Each session is left idle after its first query
+        assert {session.query(config.query) for session in sessions} == {
+            "STRING EXISTS"
+        }
+        start_time = time.perf_counter()
+        response = client_query(config)
+        duration = time.perf_counter() - start_time
+        # Parked sessions still answer later queries
+        assert sessions[0].query(config.query) == "STRING EXISTS"
+    finally:
+        for session in sessions:
+            session.close()
+
+    assert response == "STRING EXISTS"
+    assert duration < 1
 
 
-def test_server_empty_string_query(config_file, data_file):
-    create_test_data(
-        data_file, ["test string 1", "test string 2", "test query override"]
+def test_server_keep_alive_send_timeout_writes_nothing_more(data_file):
+    create_test_data(data_file, ["test string 1"])
+    config = ServerConfig(linux_path=str(data_file))
+    logger = logging.getLogger("threaded_server")
+    server = FileSearchServer(
+        config,
+        logger,
+        DEFAULT_SEARCH(config, logger),
+        server_socket=socket.create_server(("127.0.0.1", 0)),
+    )
+    client_socket = mock.MagicMock(spec=socket.socket)
+    client_socket.recv.return_value = b"test string 1\ntest string 2\n"
+    client_socket.sendall.side_effect = socket.timeout
+    try:
+        server._handle_client(client_socket, ("127.0.0.1", 0))
+    finally:
+        server.stop()
+
+    # No "STRING NOT FOUND" after the answers that timed out
+    client_socket.sendall.assert_called_once_with(
+        b"STRING EXISTS\nSTRING NOT FOUND\n"
     )
-    server_process, port, _ = server_factory(config_file=config_file)
-    config = ClientConfig(server="127.0.0.1", port=port, query="")
-    response = client_query(config)
-    assert response == "STRING NOT FOUND"
-    server_process.terminate()
 
 
-def test_server_large_file(config_file, data_file):
-    lines = [f"test string {i}" for i in range(250000)]
-    create_test_data(data_file, lines)
-    server_process, port, _ = server_factory(config_file=config_file)
+def test_server_large_file(threaded_server, big_data_file):
+    port = threaded_server(ServerConfig(linux_path=str(big_data_file)))
     config = ClientConfig(
         server="127.0.0.1", port=port, query="test string 200000"
     )
     response = client_query(config)
     assert response == "STRING EXISTS"
-    server_process.terminate()
 
 
-def test_server_reread_on_query_true(config_file, data_file):
+def test_server_reread_on_query_true(threaded_server, data_file):
     create_test_data(data_file, ["initial string"])
-    server_process, port, _ = server_factory(
-        config_file=config_file, reread_on_query=True
+    port = threaded_server(
+        ServerConfig(linux_path=str(data_file), reread_on_query=True)
     )
     config = ClientConfig(server="127.0.0.1", port=port, query="initial string")
     response = client_query(config)
@@ -89,179 +224,208 @@ def test_server_reread_on_query_true(config_file, data_file):
     create_test_data(data_file, ["changed string"])
     response = client_query(config)
     assert response == "STRING NOT FOUND"
+
+
+def test_server_workers_reread_on_query(config_file, data_file):
+    create_test_data(data_file, ["initial string"])
+    server_process, port, _ = server_factory(
+        config_file=config_file,
+        reread_on_query=True,
+        workers=2,
+        capture_stderr=False,
+    )
+    config = ClientConfig(server="127.0.0.1", port=port, query="initial string")
+    responses = {client_query(config) for _ in range(10)}
+    create_test_data(data_file, ["changed string"])
+    response = client_query(config)
     server_process.terminate()
+    drain_stderr(server_process)
+
+    assert responses == {"STRING EXISTS"}
+    assert response == "STRING NOT FOUND"
+    assert wait_for_server_shutdown(server_process, 2)
+    # the workers must have been stopped along with the parent
+    assert "Error" in client_query(config)
 
 
 def test_server_payload_size_limit(config_file, data_file):
-    create_test_data(data_file, ["A" * 1024])
+    create_test_data(data_file, [FULL_PAYLOAD])
     server_process, port, _ = server_factory(
         config_file=config_file, verbosity=logging.DEBUG
     )
-    long_string = "A" * 2048
-    config = ClientConfig(server="127.0.0.1", port=port, query=long_string)
+    config = ClientConfig(server="127.0.0.1", port=port, query=OVERSIZED_QUERY)
     response = client_query(config)
-    time.sleep(1)  # wait for things to be properly logged
+    log = wait_for_log(server_process, FULL_PAYLOAD.encode())
     server_process.terminate()
-    _, stderr = server_process.communicate()
+    drain_stderr(server_process)
 
     assert "STRING" in response
-    assert "A" * 1024 in stderr.decode()
+    assert FULL_PAYLOAD.encode() in log
 
 
 # test average time it takes to use all of the payload size
-def test_server_payload_size_limit_performance(config_file, data_file):
-    create_test_data(data_file, ["A" * 1024] * 1000)
-    server_process, port, _ = server_factory(
-        config_file=config_file, verbosity=logging.DEBUG
-    )
-    long_string = "A" * 2048
-    config = ClientConfig(server="localhost", port=port, query=long_string)
+def test_server_payload_size_limit_performance(threaded_server, data_file):
+    create_test_data(data_file, [FULL_PAYLOAD])
+    port = threaded_server(ServerConfig(linux_path=str(data_file)))
+    config = ClientConfig(server="127.0.0.1", port=port, query=OVERSIZED_QUERY)
 
     def measure_time():
-        start_time = time.time()
+        start_time = time.perf_counter()
         response = client_query(config)
-        end_time = time.time()
+        end_time = time.perf_counter()
         return response, end_time - start_time
 
-    responses, times = zip(*[measure_time() for _ in range(10)])
+    responses, times = zip(*[measure_time() for _ in range(100)])
     avg_duration = sum(times) / len(times)
     responses = set(responses)
-    server_process.terminate()
 
     assert len(responses) == 1  # all responses should be the same
-    assert avg_duration < 5e-2  # Less than 10ms avg (adjust as needed)
+    assert avg_duration < 5e-2  # Less than 50ms avg (adjust as needed)
 
 
-def test_server_strips_null_characters(config_file, data_file):
-    create_test_data(data_file, ["test string 1"])
-    server_process, port, _ = server_factory(config_file=config_file)
+def test_server_connection_refused(shared_server):
+    _, port = shared_server
     config = ClientConfig(
-        server="127.0.0.1", port=port, query="test string 1\x00\x00"
+        server="127.0.0.1", port=port + 1, query="test string"
     )
     response = client_query(config)
-    assert response == "STRING EXISTS"
-    server_process.terminate()
-
 
-def test_server_unicode_characters(config_file, data_file):
-    create_test_data(data_file, ["你好，世界"])
-    server_process, port, _ = server_factory(config_file=config_file)
-    config = ClientConfig(server="127.0.0.1", port=port, query="你好，世界")
-    response = client_query(config)
-    assert response == "STRING EXISTS"
-    server_process.terminate()
-
-
-def test_server_special_characters(config_file, data_file):
-    create_test_data(data_file, ["~!@#$%^&*()_+=-`"])
-    server_process, port, _ = server_factory(config_file=config_file)
-    config = ClientConfig(
-        server="127.0.0.1", port=port, query="~!@#$%^&*()_+=-`"
-    )
-    response = client_query(config)
-    assert response == "STRING EXISTS"
-    server_process.terminate()
+    assert "Error" in response
 
 
-def test_server_connection_refused(config_file, data_file):
-    create_test_data(data_file, ["test string"])
-    server_process, port, _ = server_factory(config_file=config_file)
+@pytest.mark.parametrize(
+    "trust_cert,expected",
+    [(True, "STRING EXISTS"), (False, "Error")],
+    ids=["trusted_cert", "no_client_cert"],
+)
+def test_server_ssl_enabled(ssl_server, ssl_files, trust_cert, expected):
     config = ClientConfig(
-        server="127.0.0.1", port=port + 1, query="test string"
+        server="localhost",
+        port=ssl_server,
+        query="test string 1",
+        ssl_enabled=True,
+        cert_file=ssl_files[0] if trust_cert else None,
     )
     response = client_query(config)
-    server_process.terminate()
-
-    assert "Error" in response
+    assert response.startswith(expected)
 
 
-def test_server_ssl_enabled(ssl_files, config_file, data_file):
-    create_test_data(data_file, ["test string 1"])
-    server_process, port, cert = server_factory(
-        config_file=config_file, ssl_enabled=True, ssl_files=ssl_files
-    )
+def test_server_ssl_keep_alive_queries(ssl_server, ssl_files):
     config = ClientConfig(
         server="localhost",
-        port=port,
+        port=ssl_server,
         query="test string 1",
         ssl_enabled=True,
-        cert_file=cert,
+        cert_file=ssl_files[0],
     )
-    response = client_query(config)
-    assert response == "STRING EXISTS"
-    server_process.terminate()
+    with ClientSession(config) as session:
+        first = session.query("test string 1")
+        second = session.query("non existing string")
+        pipelined = set(session.query_many(["test string 1"] * 2000))
+
+    assert (first, second) == ("STRING EXISTS", "STRING NOT FOUND")
+    assert pipelined == {"STRING EXISTS"}
 
 
-def test_server_ssl_enabled_no_cert(config_file, data_file):
+def test_server_ssl_enabled_no_cert(
+    config_file, data_file, capsys, monkeypatch
+):
     create_test_data(data_file, [""])
-    with pytest.raises(Exception) as e:
-        server_factory(config_file=config_file, ssl_enabled=True)
+    result = run_server_cli(capsys, monkeypatch, config_file, ssl_enabled=True)
 
-    assert "Error setting up SSL: [Errno 2] No such file or directory" in str(
-        e.value
+    assert result.returncode == 1
+    assert (
+        "Error setting up SSL: [Errno 2] No such file or directory"
+        in result.stderr
     )
 
 
-def test_server_concurrent_requests(config_file, data_file):
-    create_test_data(data_file, ["test string 1", "test string 2"])
-    server_process, port, _ = server_factory(
-        config_file=config_file, verbosity=logging.DEBUG
-    )
+@pytest.mark.parametrize("server", ["shared_server", "shared_worker_server"])
+def test_server_concurrent_requests(request, server):
+    _, port = request.getfixturevalue(server)
     config = ClientConfig(server="127.0.0.1", port=port, query="test string 1")
-    responses = set()
-    threads = []
-    for _ in range(500):
-        t = threading.Thread(target=lambda: responses.add(client_query(config)))
-        threads.append(t)
-        t.start()
-    for t in threads:
-        t.join()
-
-    assert len(responses) == 1
-    server_process.terminate()
 
+    async def query_all():
+        in_flight = asyncio.Semaphore(MAX_CONCURRENT_QUERIES)
 
-def test_server_performance(config_file, data_file):
-    create_test_data(data_file, [f"test string {i}" for i in range(250000)])
-    server_process, port, _ = server_factory(
-        config_file=config_file, reread_on_query=False
+        async def query():
+            async with in_flight:
+                return await async_client_query(config)
+
+        return await asyncio.gather(*(query() for _ in range(500)))
+
+    responses = set(asyncio.run(query_all()))
+
+    assert responses == {"STRING EXISTS"}
+
+
+def test_server_pipelined_queries(shared_server):
+    _, port = shared_server
+    config = ClientConfig(server="127.0.0.1", port=port, query="")
+    # Enough queries for several pipelined batches on one connection.
+    queries = ["test string 1", "missing"] * (2 * PIPELINE_DEPTH)
+
+    responses = client_query_many(config, queries)
+
+    assert responses == ["STRING EXISTS", "STRING NOT FOUND"] * (
+        2 * PIPELINE_DEPTH
     )
+
+
+def test_server_performance(threaded_server, big_data_file):
+    port = threaded_server(ServerConfig(linux_path=str(big_data_file)))
     config = ClientConfig(
         server="127.0.0.1", port=port, query="test string 249000"
     )
 
     total = 0
     NUMBER_OF_SAMPLES = 100  # const
-    for _ in range(NUMBER_OF_SAMPLES):
-        start_time = time.time()
-        response = client_query(config)
-        end_time = time.time()
-        duration = end_time - start_time
-        total += duration
-        assert response == "STRING EXISTS"
+    # One connection for all samples, so this times the search rather
+    # than TCP connection setup.
+    with ClientSession(config) as session:
+        for _ in range(NUMBER_OF_SAMPLES):
+            start_time = time.perf_counter()
+            response = session.query(config.query)
+            end_time = time.perf_counter()
+            duration = end_time - start_time
+            total += duration
+            assert response == "STRING EXISTS"
 
     avg_duration = total / NUMBER_OF_SAMPLES
     assert avg_duration < 5e-3  # Less than 5ms avg
-    server_process.terminate()
 
 
-def test_server_performance_reread_on_query_true(config_file, data_file):
+def test_server_pipelined_performance(threaded_server, big_data_file):
+    port = threaded_server(ServerConfig(linux_path=str(big_data_file)))
+    config = ClientConfig(
+        server="127.0.0.1", port=port, query="test string 249000"
+    )
+
+    # The whole batch in one round trip; times the server's search
+    # throughput rather than per-query latency.
+    start_time = time.perf_counter()
+    responses = client_query_many(config, [config.query] * 100)
+    duration = time.perf_counter() - start_time
+
+    assert responses == ["STRING EXISTS"] * 100
+    assert duration < 0.1
+
+
+def test_server_performance_reread_on_query_true(threaded_server, data_file):
     create_test_data(data_file, [f"test string {i}" for i in range(10000)])
-    server_process, port, _ = server_factory(
-        config_file=config_file, reread_on_query=True
+    port = threaded_server(
+        ServerConfig(linux_path=str(data_file), reread_on_query=True)
     )
     config = ClientConfig(
         server="127.0.0.1", port=port, query="test string 5000"
     )
 
-    start_time = time.time()
-    for _ in range(10):
-        response = client_query(config)
-        assert response == "STRING EXISTS"
-    end_time = time.time()
+    start_time = time.perf_counter()
+    responses = client_query_many(config, [config.query] * 10)
+    end_time = time.perf_counter()
     duration = end_time - start_time
+    assert responses == ["STRING EXISTS"] * 10
     assert duration < 1
-    server_process.terminate()
 
 
 def test_server_logging(config_file, data_file):
@@ -271,64 +435,68 @@ def test_server_logging(config_file, data_file):
     )
     config = ClientConfig(server="127.0.0.1", port=port, query="test string 1")
     client_query(config)
-
-    # wait a bit for things to be properly logged
-    time.sleep(3)
-
+    # IP= follows the query on the same log line
+    log = wait_for_log(server_process, b"IP=")
     server_process.terminate()
-    _, stderr_output = server_process.communicate()
+    drain_stderr(server_process)
 
-    assert "DEBUG: Query='test string 1'" in stderr_output.decode()
-    assert "IP=" in stderr_output.decode()
+    assert b"DEBUG: Query='test string 1'" in log
+    assert b"IP=" in log
 
 
-def test_server_invalid_config(config_file):
+def test_server_invalid_config(config_file, capsys, monkeypatch):
     invalid_config = Path(config_file).with_suffix(".invalid")
-    with pytest.raises(Exception) as e:
-        server_factory(config_file=invalid_config)
+    result = run_server_cli(capsys, monkeypatch, invalid_config)
 
-    assert "Error reading config file" in str(e.value)
+    assert result.returncode == 1
+    assert "Error reading config file" in result.stderr
 
 
 def test_server_config_invalid_port(config_file, data_file):
-    with open(config_file, "w") as f:
-        f.write("[Server]\n")
-        f.write("port=abc\n")
-        f.write(f"linuxpath={data_file}\n")
+    config_file.write_text(
+        textwrap.dedent(
+            f"""\
+            [Server]
+            port=abc
+            linuxpath={data_file}
+            """
+        )
+    )
     create_test_data(data_file, [""])
     server_process, _, _ = server_factory(
         config_file=config_file, double_config=True
     )
     server_process.terminate()
-    _, stderr = server_process.communicate()
-    output = stderr.decode()
+    output = drain_stderr(server_process)
 
     # we expect default config to be used
     assert (
-        "Error parsing server config: invalid literal for int() with base 10"
+        b"Error parsing server config: invalid literal for int() with base 10"
         in output
     )
 
 
-def test_server_config_file_not_found(config_file):
+def test_server_config_file_not_found(config_file, capsys, monkeypatch):
     non_existent_config = "non_existent_config.ini"
-    with pytest.raises(Exception) as e:
-        server_factory(
-            config_file=config_file, server_config=non_existent_config
-        )
+    result = run_server_cli(
+        capsys, monkeypatch, config_file, server_config=non_existent_config
+    )
 
+    assert result.returncode == 1
     assert (
         "Error reading extra server config file: non_existent_config.ini"
-        in str(e.value)
+        in result.stderr
     )
 
 
-def test_server_config_invalid_ssl(ssl_files, config_file, data_file):
-    cert_file, key_file = ssl_files
+def test_server_config_invalid_ssl(
+    ssl_files, config_file, data_file, tmp_path, capsys, monkeypatch
+):
+    _, key_file = ssl_files
 
-    # corrupt the cert for example
-    with open(cert_file, "w") as f:
-        f.write("corrupted cert")
+    # corrupt a copy of the cert; ssl_files is shared by the whole session
+    cert_file = tmp_path / "corrupted.crt"
+    cert_file.write_text("corrupted cert")
 
     create_test_config_for_server(
         config_file,
@@ -340,16 +508,22 @@ def test_server_config_invalid_ssl(ssl_files, config_file, data_file):
 
     create_test_data(data_file, [""])
 
-    with pytest.raises(Exception) as e:
-        server_factory(
-            config_file=config_file, ssl_enabled=True, ssl_files=ssl_files
-        )
+    result = run_server_cli(
+        capsys,
+        monkeypatch,
+        config_file,
+        ssl_enabled=True,
+        ssl_files=(cert_file, key_file),
+    )
 
-    assert "Error setting up SSL: " in str(e.value)
-    assert "[SSL] PEM lib " in str(e.value)
+    assert result.returncode == 1
+    assert "Error setting up SSL: " in result.stderr
+    assert "[SSL] PEM lib " in result.stderr
 
 
-def test_server_config_nonexistent_ssl_files(config_file, data_file):
+def test_server_config_nonexistent_ssl_files(
+    config_file, data_file, capsys, monkeypatch
+):
     create_test_config_for_server(
         config_file,
         data_file,
@@ -358,15 +532,14 @@ def test_server_config_nonexistent_ssl_files(config_file, data_file):
         key_file="non_existent_key.key",
     )
     create_test_data(data_file, [""])
-    with pytest.raises(Exception) as e:
-        server_factory(
-            config_file=config_file,
-            ssl_enabled=True,
-            double_config=True,
-        )
+    result = run_server_cli(
+        capsys, monkeypatch, config_file, ssl_enabled=True, double_config=True
+    )
 
-    assert "Error setting up SSL: [Errno 2] No such file or directory" in str(
-        e.value
+    assert result.returncode == 1
+    assert (
+        "Error setting up SSL: [Errno 2] No such file or directory"
+        in result.stderr
     )
 
 
@@ -375,60 +548,69 @@ def test_server_dynamic_port(config_file, data_file):
     create_test_config_for_server(
         config_file, data_file, port=None
     )  # Don't specify port in config
-    server_process, port, _ = server_factory(config_file=config_file)
+    server_process, port, _ = server_factory(
+        config_file=config_file, capture_stderr=False
+    )
     assert port is not None
     assert isinstance(port, int)
     server_process.terminate()
+    drain_stderr(server_process)
 
 
 def test_server_dynamic_port_override(config_file, data_file):
-    override_port = 8080
+    override_port = worker_free_port()
     create_test_data(data_file, [""])
     create_test_config_for_server(config_file, data_file)
     server_process, port, _ = server_factory(
-        config_file=config_file, port=override_port
+        config_file=config_file, port=override_port, capture_stderr=False
     )
     assert port == override_port
     server_process.terminate()
+    drain_stderr(server_process)
 
 
-def test_server_dynamic_search_algorithm(config_file, data_file):
-    create_test_config_for_server(config_file, data_file)
+def test_server_port_not_shared_without_workers(data_file):
     create_test_data(data_file, ["test string 1"])
-    server_process, _, _ = server_factory(
-        config_file=config_file,
-        double_config=True,
-        search_algorithm="set",
-    )
-    server_process.terminate()
-    _, stderr = server_process.communicate()
-    assert "Using SetSearch algorithm" in stderr.decode()
-
-
-def test_server_dynamic_search_algorithm_default(config_file, data_file):
-    create_test_config_for_server(config_file, data_file)
-    create_test_data(data_file, ["test string 1"])
-    server_process, _, _ = server_factory(
-        config_file=config_file, server_config=config_file, double_config=True
-    )
-    server_process.terminate()
-    _, stderr = server_process.communicate()
-    assert f"Using {DEFAULT_SEARCH.__name__} algorithm." in stderr.decode()
-
-
-def test_server_dynamic_search_algorithm_import_error(config_file, data_file):
+    config = ServerConfig(linux_path=str(data_file), port=worker_free_port())
+    logger = logging.getLogger("threaded_server")
+    first = FileSearchServer(config, logger, DEFAULT_SEARCH(config, logger))
+    try:
+        with pytest.raises(SystemExit):
+            FileSearchServer(config, logger, DEFAULT_SEARCH(config, logger))
+    finally:
+        first.stop()
+
+
+@pytest.mark.parametrize(
+    "search_algorithm,expected_logs",
+    [
+        ("set", [b"Using SetSearch algorithm"]),
+        (None, [USING_DEFAULT_SEARCH]),
+        (
+            "invalid_search",
+            [
+                b"Error importing invalid_search",
+                b"No module named 'core.algorithms.invalid_search_search'.",
+                # The fallback is logged after the import error
+                USING_DEFAULT_SEARCH,
+            ],
+        ),
+    ],
+    ids=["set", "default", "import_error"],
+)
+def test_server_dynamic_search_algorithm(
+    config_file, data_file, search_algorithm, expected_logs
+):
     create_test_config_for_server(config_file, data_file)
     create_test_data(data_file, ["test string 1"])
     server_process, _, _ = server_factory(
         config_file=config_file,
-        server_config=config_file,
         double_config=True,
-        search_algorithm="invalid_search",
+        search_algorithm=search_algorithm,
     )
+    log = wait_for_log(server_process, expected_logs[-1])
     server_process.terminate()
-    _, stderr = server_process.communicate()
-    log = stderr.decode()
+    drain_stderr(server_process)
 
-    assert f"Error importing invalid_search" in log
-    assert "No module named 'core.algorithms.invalid_search_search'." in log
-    assert f"Using {DEFAULT_SEARCH.__name__} algorithm." in log
+    for expected in expected_logs:
+        assert expected in log
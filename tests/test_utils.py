@@ -0,0 +1,19 @@
+import socket
+
+from core.utils import find_available_port, is_port_in_use
+from tests.utils import worker_port_base
+
+
+def test_is_port_in_use():
+    with socket.create_server(("", 0)) as listener:
+        port = listener.getsockname()[1]
+        assert is_port_in_use(port)
+    assert not is_port_in_use(port)
+
+
+def test_find_available_port_stays_in_range():
+    start_port = worker_port_base()
+    port = find_available_port(start_port)
+    assert port is not None
+    assert start_port <= port <= start_port + 1000
+    assert not is_port_in_use(port)
@@ -1,25 +1,44 @@
+import io
 import logging
 import os
-import random
+import runpy
+import select
 import socket
 import subprocess
 import sys
+import tempfile
+import threading
 import time
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Optional, Tuple
+from unittest import mock
+
+import pytest
 
 from core.config import load_extra_server_config
 from core.logger import Verbosity
+from core.utils import find_available_port, generate_test_file  # noqa: F401
 
 SERVER_STARTUP_TIMEOUT = 2
-
-
-def generate_test_file(filepath: str, num_lines: int, logger: logging.Logger):
-    """Generates a test file with random lines."""
-    logger.debug(f"Generating test file: {filepath} with {num_lines} lines")
-    with open(filepath, "w") as f:
-        for _ in range(num_lines):
-            f.write(f"test string {random.randint(0, num_lines)}\n")
+# Pause between readiness probes while the server's port refuses
+# connections; a pre-bound port queues them, so the probe itself waits.
+SERVER_POLL_INTERVAL = 0.005
+CLIENT_PY = str(Path(__file__).parent.parent / "core" / "client.py")
+SERVER_PY = str(Path(__file__).parent.parent / "core" / "server.py")
+# The server's -v flag for each log level
+VERBOSITY_FLAGS = {
+    logging.DEBUG: "-vvvv",
+    logging.INFO: "-vvv",
+    logging.WARNING: "-vv",
+    logging.ERROR: "-v",
+}
+# Swallows the errors of parsing a config file only to find its port
+SILENT_LOGGER = logging.getLogger("silent_logger")
+SILENT_LOGGER.addHandler(logging.NullHandler())
+SILENT_LOGGER.propagate = False
 
 
 def check_file_exists(file_path: str) -> bool:
@@ -27,42 +46,96 @@ def check_file_exists(file_path: str) -> bool:
     return os.path.exists(file_path)
 
 
-def is_port_in_use(port: int) -> bool:
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        return s.connect_ex(("localhost", port)) == 0
+def worker_port_base() -> int:
+    """First port of this pytest-xdist worker's range of 1000 ports.
+
+    gw0 (or no xdist) gets 40000-40999, gw1 41000-41999 and so on, so
+    parallel workers never pick the same fixed port.
+    """
+    worker = os.environ.get("PYTEST_XDIST_WORKER", "gw0")
+    return 40000 + int(worker[2:]) * 1000
+
+
+def worker_free_port() -> int:
+    """Returns a currently free port in this worker's range."""
+    port = find_available_port(worker_port_base())
+    if port is None:
+        raise RuntimeError("Could not find an available port for the test.")
+    return port
 
 
-def find_available_port(start_port: int, max_ports: int = 100) -> Optional[int]:
-    """Find an available port. Returns None if all ports are taken."""
-    tried_ports = set()
-    for _ in range(max_ports):
-        port = random.randint(start_port, start_port + 1000)
-        if port not in tried_ports:
-            if not is_port_in_use(port):
-                return port
-            tried_ports.add(port)
-    return None
+def _write_if_changed(config_file: str, text: str):
+    """Writes text to config_file unless it already holds exactly that."""
+    path = Path(config_file)
+    try:
+        if path.read_text() == text:
+            return
+    except FileNotFoundError:
+        pass
+    path.write_text(text)
+
+
+@lru_cache(maxsize=64)
+def _render_server_config(
+    data_file: str,
+    port: Optional[int],
+    reread_on_query: bool,
+    ssl_enabled: bool,
+    cert_file: Optional[str],
+    key_file: Optional[str],
+) -> str:
+    lines = [
+        "[Server]",
+        f"port={port}",
+        f"reread_on_query={reread_on_query}",
+        f"linuxpath={data_file}",
+        f"ssl={ssl_enabled}",
+    ]
+    if ssl_enabled and cert_file and key_file:
+        lines += [f"certfile={cert_file}", f"keyfile={key_file}"]
+    return "\n".join(lines) + "\n"
+
+
+@lru_cache(maxsize=64)
+def _render_client_config(
+    server: str,
+    port: int,
+    query: Optional[str],
+    ssl_enabled: bool,
+    cert_file: Optional[str],
+    key_file: Optional[str],
+) -> str:
+    lines = [f"server={server}", f"port={port}"]
+    if query:
+        lines.append(f"query={query}")
+    lines.append(f"ssl={ssl_enabled}")
+    if ssl_enabled and cert_file and key_file:
+        lines += [f"certfile={cert_file}", f"keyfile={key_file}"]
+    return "\n".join(lines) + "\n"
 
 
 def create_test_config_for_server(
     config_file: str,
     data_file: str,
-    port: int = 44445,
+    port: Optional[int] = 0,
     reread_on_query: bool = False,
     ssl_enabled: bool = False,
     cert_file: Optional[str] = None,
     key_file: Optional[str] = None,
 ):
-    """Create a test config file."""
-    with open(config_file, "w") as f:
-        f.write("[Server]\n")
-        f.write(f"port={port}\n")
-        f.write(f"reread_on_query={str(reread_on_query)}\n")
-        f.write(f"linuxpath={data_file}\n")
-        f.write(f"ssl={ssl_enabled}\n")
-        if ssl_enabled and cert_file and key_file:
-            f.write(f"certfile={cert_file}\n")
-            f.write(f"keyfile={key_file}\n")
+    """Create a test config file.
+
+    A port of 0 picks a free port in this test worker's range. The file
+    is left untouched if it already has the same contents.
+    """
+    if port == 0:
+        port = worker_free_port()
+    _write_if_changed(
+        config_file,
+        _render_server_config(
+            data_file, port, reread_on_query, ssl_enabled, cert_file, key_file
+        ),
+    )
 
 
 def create_test_config_for_client(
@@ -75,44 +148,127 @@ def create_test_config_for_client(
     key_file: Optional[str] = None,
 ):
     """Create a test config file for the client."""
-    with open(config_file, "w") as f:
-        f.write(f"server={server}\n")
-        f.write(f"port={port}\n")
-        if query:
-            f.write(f"query={query}\n")
-        f.write(f"ssl={ssl_enabled}\n")
-        if ssl_enabled and cert_file and key_file:
-            f.write(f"certfile={cert_file}\n")
-            f.write(f"keyfile={key_file}\n")
+    _write_if_changed(
+        config_file,
+        _render_client_config(
+            server, port, query, ssl_enabled, cert_file, key_file
+        ),
+    )
 
 
 def create_test_data(data_file: str, lines: list[str]):
-    """Create a test data file."""
-    with open(data_file, "w") as f:
-        for line in lines:
-            f.write(line + "\n")
+    """Create a test data file.
+
+    When rewriting an existing file, makes sure its mtime changes even on
+    filesystems with coarse timestamps, so a running server notices it.
+    """
+    path = Path(data_file)
+    try:
+        previous_mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        previous_mtime = None
+    data = ("\n".join(lines) + "\n").encode("utf-8") if lines else b""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        if data and hasattr(os, "posix_fallocate"):
+            # Reserve the whole file up front rather than growing it
+            os.posix_fallocate(fd, 0, len(data))
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view) :]
+    finally:
+        os.close(fd)
+    if previous_mtime is not None and path.stat().st_mtime_ns <= previous_mtime:
+        bumped = previous_mtime + 1_000_000_000
+        os.utime(path, ns=(bumped, bumped))
 
 
 def wait_for_server_shutdown(
     server_process: subprocess.Popen, timeout: int
 ) -> bool:
     """Waits for the server to shutdown completely."""
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        if server_process.poll() is not None:
-            return True
-        time.sleep(0.1)
-    return False
+    try:
+        server_process.wait(timeout)
+        return True
+    except subprocess.TimeoutExpired:
+        return False
 
 
-def is_port_available(port: int) -> bool:
-    """Checks if a port is available."""
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        try:
-            s.bind(("localhost", port))
+def drain_stderr(
+    server_process: subprocess.Popen, timeout: float = 0.5
+) -> bytes:
+    """Waits for a stopping server to exit and returns the rest of its stderr.
+
+    Kills the server if it hasn't exited within timeout seconds, so a
+    server stuck in shutdown can't hang the test.
+    """
+    try:
+        _, stderr = server_process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        server_process.kill()
+        _, stderr = server_process.communicate()
+    return stderr or b""
+
+
+def wait_for_log(
+    server_process: subprocess.Popen, needle: bytes, timeout: float = 2.0
+) -> bytes:
+    """Reads the server's stderr until it contains needle.
+
+    Returns everything read so far, or raises TimeoutError if needle does
+    not show up within timeout seconds. Reads the pipe's fd directly, so
+    don't mix it with reads from server_process.stderr itself.
+    """
+    fd = server_process.stderr.fileno()
+    output = bytearray()
+    deadline = time.monotonic() + timeout
+    while needle not in output:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(
+                f"{needle!r} not logged within {timeout}s:\n{output.decode()}"
+            )
+        readable, _, _ = select.select([fd], [], [], remaining)
+        if readable:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                raise EOFError(
+                    f"Server exited before logging {needle!r}:\n"
+                    f"{output.decode()}"
+                )
+            output += chunk
+    return bytes(output)
+
+
+def _config_port(server_config: Optional[str]) -> Optional[int]:
+    """Returns the port set in an extra server config file, if any."""
+    if not server_config:
+        return None
+    # load_extra_server_config caches by path, mtime and size
+    config = load_extra_server_config(server_config, SILENT_LOGGER)
+    return config.port if config else None
+
+
+def _server_ready(port: int) -> bool:
+    """Checks whether the server is accepting connections on the port.
+
+    A listening socket completes connections before the server accepts
+    them, so a successful connect alone proves nothing. The probe sends an
+    empty query and waits for the server to answer or close it cleanly (a
+    TLS server rejects it as a bad handshake); either means it is accepting.
+    """
+    try:
+        with socket.create_connection(
+            ("127.0.0.1", port), timeout=0.1
+        ) as probe:
+            probe.sendall(b"\n")
+            probe.shutdown(socket.SHUT_WR)
+            probe.recv(1)
             return True
-        except OSError:
-            return False
+    except OSError:
+        # Refused, timed out, or reset because the server exited with the
+        # connection still queued.
+        return False
 
 
 def _build_server_args(
@@ -124,63 +280,52 @@ def _build_server_args(
     server_config: Optional[str] = None,
     verbosity: Verbosity = logging.INFO,
     search_algorithm: Optional[str] = None,
+    workers: Optional[int] = None,
+    listen_fd: Optional[int] = None,
 ) -> Tuple[List[str], int, Optional[str]]:
     """Builds the server arguments."""
-    python_executable = sys.executable
-    server_py = Path(__file__).parent.parent / "core" / "server.py"
     server_args = [
-        python_executable,
-        str(server_py),
+        sys.executable,
+        # Skip the user site directory; -S/-I would also drop the
+        # environment's site-packages and PYTHONPATH, where core lives.
+        "-s",
+        SERVER_PY,
         "--config",
         str(config_file),
     ]
 
-    # Map log levels to number of -v flags
-    v_count = {
-        logging.DEBUG: 4,
-        logging.INFO: 3,
-        logging.WARNING: 2,
-        logging.ERROR: 1,
-    }.get(verbosity, 0)
-
-    if v_count:
-        server_args.extend(["-" + "v" * v_count])
+    v_flag = VERBOSITY_FLAGS.get(verbosity)
+    if v_flag:
+        server_args.append(v_flag)
 
     cert_file, key_file = ssl_files if ssl_files else (None, None)
 
     # we are intentionally attempting to
     # extract server_config here for some port since we cannot
     # peer into the process from the outside for the port
-    effective_port = port
-    if server_config:
-        silent_logger = logging.getLogger("silent_logger")
-        silent_logger.addHandler(logging.NullHandler())
-        config = load_extra_server_config(server_config, silent_logger)
-        if config and config.port:
-            effective_port = effective_port or config.port
-
-    if effective_port is None:
-        effective_port = find_available_port(44445)
-        if effective_port is None:
-            raise RuntimeError(
-                "Could not find an available port to start the server."
-            )
+    effective_port = port or _config_port(server_config)
 
-    server_args.extend(["--port", str(effective_port)])
+    if listen_fd is not None:
+        server_args += ("--listen_fd", str(listen_fd))
+    elif effective_port:
+        server_args += ("--port", str(effective_port))
 
     if search_algorithm:
-        server_args.extend(["--search_algorithm", search_algorithm])
+        server_args += ("--search_algorithm", search_algorithm)
+
+    if workers:
+        server_args += ("--workers", str(workers))
 
     if ssl_enabled:
-        server_args.extend(["--ssl_enabled"])
+        server_args.append("--ssl_enabled")
         if cert_file:
-            server_args.extend(["--certfile", str(cert_file)])
+            server_args += ("--certfile", str(cert_file))
         if key_file:
-            server_args.extend(["--keyfile", str(key_file)])
+            server_args += ("--keyfile", str(key_file))
     if reread_on_query:
-        server_args.extend(["--reread_on_query"])
+        server_args.append("--reread_on_query")
     if server_config:
-        server_args.extend(["--server_config", str(server_config)])
+        server_args += ("--server_config", str(server_config))
 
     return server_args, effective_port, cert_file
 
@@ -195,6 +340,8 @@ def server_factory(
     double_config: bool = False,
     verbosity: Verbosity = logging.INFO,
     search_algorithm: Optional[str] = None,
+    workers: Optional[int] = None,
+    capture_stderr: bool = True,
 ) -> Tuple[subprocess.Popen[bytes], int, Optional[str]]:
     """Creates and starts the server process for testing.
 
@@ -206,8 +353,13 @@ def server_factory(
         ssl_files: Tuple of SSL certificate and key file paths.
         server_config: Path to an additional server configuration file.
         double_config: If True, uses the `config_file` also as the `server_config`.
-        debug: Whether to enable debug mode for the server.
-        stderr: Optional list to capture the server's stderr output.
+        verbosity: Log level the server runs with.
+        search_algorithm: Name of the search algorithm the server should use.
+        workers: Number of worker processes the server should fork.
+        capture_stderr: Pipe the server's stderr for wait_for_log and
+            drain_stderr. Tests that never read it should pass False, so
+            the server can't block on a full pipe; its stderr then goes
+            to a temporary file, only read if the server fails to start.
     Returns:
         A tuple containing the subprocess.Popen object, the port the server is running on,
         and the path to the SSL certificate file (if SSL is enabled).
@@ -217,6 +369,14 @@ def server_factory(
     effective_server_config = server_config or (
         config_file if double_config else None
     )
+    listen_socket = None
+    if port is None and not _config_port(effective_server_config):
+        # Bind here and hand the socket to the server, so no other process
+        # can take the port between choosing it and the server binding it.
+        listen_socket = socket.create_server(
+            ("", 0), reuse_port=hasattr(socket, "SO_REUSEPORT")
+        )
+        port = listen_socket.getsockname()[1]
     server_args, effective_port, cert_file = _build_server_args(
         config_file,
         port,
@@ -226,23 +386,139 @@ def server_factory(
         effective_server_config,
         verbosity,
         search_algorithm,
+        workers,
+        listen_socket.fileno() if listen_socket else None,
     )
 
-    server_process = subprocess.Popen(server_args, stderr=subprocess.PIPE)
+    # Without a pipe, the server's stderr goes to a file that is only read
+    # if the server fails to start.
+    stderr_file = None if capture_stderr else tempfile.TemporaryFile()
+    try:
+        try:
+            server_process = subprocess.Popen(
+                server_args,
+                stderr=subprocess.PIPE if capture_stderr else stderr_file,
+                pass_fds=(listen_socket.fileno(),) if listen_socket else (),
+            )
+        finally:
+            if listen_socket:
+                listen_socket.close()
+
+        deadline = time.monotonic() + SERVER_STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if server_process.poll() is not None:
+                break
+            if _server_ready(effective_port):
+                return server_process, effective_port, cert_file
+            time.sleep(SERVER_POLL_INTERVAL)
+
+        # The server exited or never started accepting connections
+        server_process.terminate()
+        err_out = drain_stderr(server_process)
+        if stderr_file:
+            stderr_file.seek(0)
+            err_out = stderr_file.read()
+    finally:
+        if stderr_file:
+            stderr_file.close()
+    error_msg = (
+        f"Server process on port {effective_port} did not start accepting "
+        f"connections within {SERVER_STARTUP_TIMEOUT} seconds. "
+        f"Stderr:\n{err_out.decode()}"
+    )
+    raise Exception(error_msg)
 
-    # Wait for a short grace period and then check if the port is in use
-    time.sleep(0.1)
-    start_time = time.time()
-    while time.time() - start_time < SERVER_STARTUP_TIMEOUT:
-        if not is_port_available(effective_port):
-            return server_process, effective_port, cert_file
-        time.sleep(0.1)
 
-    # If the port is still available after the timeout, the server likely failed
-    server_process.terminate()
-    _, err_out = server_process.communicate()
-    error_msg = f"Server process started but port {effective_port} is not in use after {SERVER_STARTUP_TIMEOUT} seconds. Stderr:\n{err_out.decode()}"
-    raise Exception(error_msg)
+def run_server_cli(
+    capsys: pytest.CaptureFixture,
+    monkeypatch: pytest.MonkeyPatch,
+    config_file: str,
+    ssl_enabled: bool = False,
+    ssl_files: Optional[Tuple[str, str]] = None,
+    server_config: Optional[str] = None,
+    double_config: bool = False,
+) -> subprocess.CompletedProcess:
+    """Runs server.py as __main__ in this process for a start-up failure.
+
+    Meant for configurations the server rejects while starting, without
+    paying for a Python interpreter per test. Runs on a thread so that a
+    server which starts after all fails the test instead of blocking it;
+    that server is stopped before this returns. The test's capsys and
+    monkeypatch fixtures capture stderr and swap sys.argv.
+    """
+    server_args, _, _ = _build_server_args(
+        config_file,
+        ssl_enabled=ssl_enabled,
+        ssl_files=ssl_files,
+        server_config=server_config or (config_file if double_config else None),
+    )
+    argv = server_args[server_args.index(SERVER_PY) :]
+    monkeypatch.setattr(sys, "argv", argv)
+    capsys.readouterr()
+    # Run the script in a namespace of our own, so a server that did start
+    # can be reached and stopped.
+    code = compile(Path(SERVER_PY).read_text(), SERVER_PY, "exec")
+    namespace = {"__name__": "__main__", "__file__": SERVER_PY}
+    returncode = None
+
+    def run():
+        nonlocal returncode
+        try:
+            exec(code, namespace)
+            returncode = 0
+        except SystemExit as e:
+            returncode = e.code if isinstance(e.code, int) else 1
+        except Exception:
+            traceback.print_exc()
+            returncode = 1
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(SERVER_STARTUP_TIMEOUT)
+    started = thread.is_alive()
+    if started and "server" in namespace:
+        namespace["server"].stop()
+        thread.join(SERVER_STARTUP_TIMEOUT)
+    # The server's log handlers write to the captured stream; drop them so
+    # the next run starts with fresh ones.
+    server_logger = logging.getLogger("server")
+    for handler in server_logger.handlers[:]:
+        server_logger.removeHandler(handler)
+        handler.close()
+    stderr = capsys.readouterr().err
+    if started:
+        raise RuntimeError(f"Server did not exit during start-up:\n{stderr}")
+    return subprocess.CompletedProcess(argv[1:], returncode, "", stderr)
+
+
+def run_client_cli(argv: List[str]) -> subprocess.CompletedProcess:
+    """Runs client.py as __main__ in this process, capturing its output.
+
+    Avoids starting a Python interpreter per client invocation. Uncaught
+    exceptions are printed and reported as exit code 1, as they would be
+    for a separate process.
+    """
+    stdout, stderr = io.StringIO(), io.StringIO()
+    returncode = 0
+    with mock.patch.object(sys, "argv", [CLIENT_PY, *argv]):
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            try:
+                runpy.run_path(CLIENT_PY, run_name="__main__")
+            except SystemExit as e:
+                returncode = e.code if isinstance(e.code, int) else 1
+            except Exception:
+                traceback.print_exc()
+                returncode = 1
+            finally:
+                # The client's log handlers write to the captured streams;
+                # drop them so the next run starts with fresh ones.
+                client_logger = logging.getLogger("ClientLogger")
+                for handler in client_logger.handlers[:]:
+                    client_logger.removeHandler(handler)
+                    handler.close()
+    return subprocess.CompletedProcess(
+        argv, returncode, stdout.getvalue(), stderr.getvalue()
+    )
 
 
 def create_test_client_process(
@@ -253,10 +529,8 @@ def create_test_client_process(
     ssl_enabled: bool = False,
     cert_file: Optional[Path | str] = None,
 ) -> subprocess.CompletedProcess:
-    """Creates and runs the client process for testing"""
-    client_py = Path(__file__).parent.parent / "core" / "client.py"
-    python_executable = sys.executable
-    client_args = [python_executable, str(client_py)]
+    """Runs the client CLI for testing"""
+    client_args = []
 
     if config_file:
         client_args.extend(["--client_config", str(config_file)])
@@ -271,9 +545,4 @@ def create_test_client_process(
     if cert_file:
         client_args.extend(["--cert_file", str(cert_file)])
 
-    process = subprocess.run(
-        client_args,
-        capture_output=True,
-        text=True,
-    )
-    return process
+    return run_client_cli(client_args)